@@ -0,0 +1,179 @@
+import streamlit as st
+import numpy as np
+import os
+import geopandas as gpd
+import shapely
+import folium
+import branca.colormap as cm
+
+### PRICE AREA GEOMETRY ###
+
+AREAS_GEOJSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages", "maps_area.geojson")
+OUTSIDE_AREAS = "Outside defined areas"
+
+# Simplification tolerance of the hit-testing polygons (degrees, about 100 m). The full
+# polygons have ~55k vertices, the simplified ones ~3k, and a click on the map cannot
+# resolve anything close to this distance.
+HIT_TOLERANCE_DEG = 0.001
+
+
+def load_price_areas(path=AREAS_GEOJSON):
+    """Read the Elspot price area polygons in EPSG:4326."""
+    gdf = gpd.read_file(path)
+    gdf = gdf.to_crs(epsg=4326)
+    return gdf
+
+
+class PriceAreaIndex:
+    """Point-in-price-area lookups on an STRtree of simplified, prepared area polygons.
+
+    Lookups take arrays of points, so a whole list of clicked points or meter locations
+    is resolved with one vectorized tree query.
+    """
+
+    def __init__(self, gdf, tolerance=HIT_TOLERANCE_DEG):
+        self.names = gdf["ElSpotOmr"].to_numpy()
+        self.geometries = gdf.geometry.to_numpy()
+        self.hit_geometries = shapely.simplify(self.geometries, tolerance, preserve_topology=True)
+        shapely.prepare(self.hit_geometries)
+        self.tree = shapely.STRtree(self.hit_geometries)
+
+    def lookup(self, lats, lons):
+        """Return the position of the area containing every point, -1 where it is outside all areas."""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        point_idx, area_idx = self.tree.query(shapely.points(lons, lats), predicate="within")
+
+        # A point on a shared border can fall in two areas, keep the first one
+        result = np.full(len(lats), -1, dtype=np.int64)
+        points, first = np.unique(point_idx, return_index=True)
+        result[points] = area_idx[first]
+        return result
+
+    def area_names(self, lats, lons):
+        """Return the price area name of every point, OUTSIDE_AREAS where no area contains it."""
+        idx = self.lookup(lats, lons)
+        return np.where(idx >= 0, self.names[idx], OUTSIDE_AREAS)
+
+    def area_of(self, lat, lon):
+        """Return (area name, full resolution geometry) of one point, geometry None when outside."""
+        idx = self.lookup(lat, lon)[0]
+        if idx < 0:
+            return OUTSIDE_AREAS, None
+        return str(self.names[idx]), self.geometries[idx]
+
+
+### MULTI-RESOLUTION RENDERING ###
+
+# Zoom levels with a prebuilt geometry, the map uses the finest level not above its zoom
+AREA_ZOOM_LEVELS = (4, 6, 8, 10)
+AREA_LEVELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".area_levels")
+
+
+def zoom_tolerance(zoom):
+    """Half a pixel of a 256 px web mercator tile at `zoom`, in degrees of longitude."""
+    return 360 / (256 * 2 ** zoom) / 2
+
+
+def area_level_for_zoom(zoom):
+    return max([level for level in AREA_ZOOM_LEVELS if level <= zoom], default=AREA_ZOOM_LEVELS[0])
+
+
+def area_level_path(level, path=AREA_LEVELS_DIR):
+    return os.path.join(path, f"areas_z{level}.geojson")
+
+
+def simplify_areas(gdf, level):
+    """Simplify the price areas for rendering at zoom `level`.
+
+    The areas are simplified as one coverage, so neighbouring areas keep identical
+    shared borders without gaps or overlaps. Only the name column is kept.
+    """
+    geometry = shapely.coverage_simplify(gdf.geometry.to_numpy(), zoom_tolerance(level))
+    return gpd.GeoDataFrame({"ElSpotOmr": gdf["ElSpotOmr"].to_numpy()}, geometry=geometry, crs=gdf.crs)
+
+
+def build_area_levels(gdf, path=AREA_LEVELS_DIR):
+    """Write the simplified geometry of every zoom level and return the written paths."""
+    os.makedirs(path, exist_ok=True)
+    paths = []
+    for level in AREA_ZOOM_LEVELS:
+        target = area_level_path(level, path)
+        simplify_areas(gdf, level).to_file(target + ".tmp", driver="GeoJSON")
+        os.replace(target + ".tmp", target)
+        paths.append(target)
+    return paths
+
+
+def area_layer(areas, values=None, bins=None, selected=None, legend_name="Mean Energy (kWh)"):
+    """One GeoJson layer with the outlines, optional choropleth fill, highlight and tooltip.
+
+    `values` maps a price area code without spaces ("NO1") to its value, `bins` gives the
+    colour steps. Returns the layer and the legend colormap (None without values), so
+    every area geometry is serialized into the page once.
+    """
+    areas = areas.copy()
+    areas["join_key"] = areas["ElSpotOmr"].str.replace(" ", "")
+    fields, aliases, colormap = ["ElSpotOmr"], ["Price Area"], None
+    if values is not None:
+        areas["quantityKwh"] = areas["join_key"].map(values)
+        fields, aliases = fields + ["quantityKwh"], aliases + ["Mean kWh"]
+        # One colour per bin (len(bins) - 1), so the fill and the legend agree on every step
+        colormap = cm.linear.YlOrRd_09.to_step(index=bins)
+        colormap.caption = legend_name
+
+    def style(feature):
+        props = feature["properties"]
+        value = props.get("quantityKwh")
+        is_selected = props["ElSpotOmr"] == selected
+        return {
+            'fillColor': colormap(value) if colormap is not None and value is not None else 'transparent',
+            'color': 'cyan' if is_selected else 'blue',
+            'weight': 5 if is_selected else 3,
+            'fillOpacity': 0.6 if colormap is not None and value is not None else 0.0
+        }
+
+    layer = folium.GeoJson(
+        areas,
+        name="Price Areas",
+        style_function=style,
+        tooltip=folium.GeoJsonTooltip(
+            fields=fields,
+            aliases=aliases,
+            labels=True,
+            sticky=True,
+            style="background-color: white; color: #333; font-size: 12px; padding: 5px;"
+        )
+    )
+    return layer, colormap
+
+
+def legend_html(colormap, width=450):
+    """HTML legend of a step colormap from area_layer: a swatch per bin above the bin edges."""
+    edges = colormap.index
+    swatches = "".join(f'<div style="flex:1;height:12px;background:{colormap.rgb_hex_str((lo + hi) / 2)}"></div>'
+                       for lo, hi in zip(edges[:-1], edges[1:]))
+    labels = "".join(f"<span>{edge:,.0f}</span>" for edge in edges)
+    return (f'<div style="width:{width}px;font-size:12px">'
+            f"<div>{colormap.caption}</div>"
+            f'<div style="display:flex">{swatches}</div>'
+            f'<div style="display:flex;justify-content:space-between">{labels}</div></div>')
+
+
+@st.cache_data
+def price_area_level(level):
+    # Prebuilt by scripts/build_area_levels.py, simplified here when the file is missing
+    path = area_level_path(level)
+    if os.path.exists(path):
+        return gpd.read_file(path)
+    return simplify_areas(price_areas(), level)
+
+
+@st.cache_data
+def price_areas():
+    return load_price_areas()
+
+
+@st.cache_resource
+def price_area_index():
+    return PriceAreaIndex(price_areas())
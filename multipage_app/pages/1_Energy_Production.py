@@ -4,9 +4,10 @@ import pymongo
 import pandas as pd
 import plotly.express as px
 import calendar
+from datetime import datetime
 
 
-from utils import get_production_data 
+from utils import get_aggregated_data
 
 st.markdown(" ##  Energy Production Insights  ")
 st.text(
@@ -19,8 +20,9 @@ year = st.radio("Select Year",options=[2021, 2022, 2023, 2024],index=None)
 if year is None:
     st.warning(" Please select a year to continue.")
     st.stop()
-# DataFrame
-mongodb_df = get_production_data(year)
+# DataFrame of yearly totals per area and group, summed from the rollups by get_aggregated_data
+totals_df = get_aggregated_data("production", group_by=["priceArea", "productionGroup"],
+                                aggs={"total_production": "sum"}, year=year)
 
 #Using st.columns to split view in 2 parts
 col_left,col_right=st.columns(2)
@@ -31,12 +33,11 @@ with col_left:
     st.write("") 
     st.write(f"View the total production of different energy groups for the {year} in the selected area.")
     
-    price_areas = sorted(mongodb_df['priceArea'].unique())
+    price_areas = sorted(totals_df['priceArea'].unique())
     selected_price_area=st.radio("Select an area:",price_areas,key="price_area_radio")
 
     if selected_price_area:
-        filtered_df_area=mongodb_df[mongodb_df["priceArea"]==selected_price_area]\
-        .groupby("productionGroup").agg(total_production=("quantityKwh", "sum")).reset_index()
+        filtered_df_area=totals_df[totals_df["priceArea"]==selected_price_area]
         
         #Creating a Plotly pie chart
         fig = px.pie(filtered_df_area,
@@ -59,15 +60,12 @@ with col_right:
     st.write("") 
     st.write("Visualize the production trends of selected production groups for the chosen area and month.")
     #Extracting all the production groups in a list
-    production_groups=mongodb_df['productionGroup'].unique().tolist() 
+    production_groups=totals_df['productionGroup'].unique().tolist() 
 
 
     #Adding an st.pills to select multiple groups
     selected_group=st.pills("Select the production groups:",production_groups,selection_mode="multi")
 
-    #Adding a month column extracted from startTime for easy filtering
-    mongodb_df['month'] = mongodb_df['startTime'].dt.month_name()
-
     #Generating a list of month names using calendar.month_name
     months = list(calendar.month_name)[1:]  
 
@@ -75,9 +73,13 @@ with col_right:
     selected_month = st.selectbox("Select a month:", months)
 
     if selected_group:
-        #Filtering data for selected price area,month and selected group and then grouping and aggregating accordingly
-        filtered_df_month_group_area=mongodb_df[(mongodb_df["priceArea"]==selected_price_area)&(mongodb_df["productionGroup"].isin(selected_group))&(mongodb_df["month"]==selected_month)]
-        grouped_df_month_group=filtered_df_month_group_area.groupby(["startTime","productionGroup"]).agg(total_production=("quantityKwh", "sum")).reset_index()
+        #Hourly totals for selected price area, month and groups, filtered and summed by get_aggregated_data
+        month_index = months.index(selected_month) + 1
+        month_start = datetime(year, month_index, 1)
+        month_end = datetime(year + month_index // 12, month_index % 12 + 1, 1)
+        grouped_df_month_group=get_aggregated_data("production", group_by=["productionGroup"], time_bucket="hour",
+            aggs={"total_production": "sum"}, start_date=month_start, end_date=month_end,
+            filters={"priceArea": selected_price_area, "productionGroup": selected_group})
         
         #Plotting line chart using plotly
         fig = px.line(grouped_df_month_group,x='startTime',y='total_production',
@@ -1,17 +1,17 @@
 import streamlit as st
 import matplotlib.dates as mdates
-from scipy.signal import stft
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 from plotly.subplots import make_subplots
-from statsmodels.tsa.seasonal import STL
 
 
 # DataFrame
 
-from utils import get_production_data
+from utils import get_production_data, get_aggregated_data
+from stl_utils import stl_components, choose_stl_engine, spectrogram, stft_shape
+from plot_utils import scatter, show_chart, zoom_window, in_window
 
 st.markdown("## **STL Decomposition & Spectrogram Analysis**")
 st.markdown(
@@ -25,51 +25,50 @@ year = st.radio("Select Year",options=[2021, 2022, 2023, 2024],index=None)
 if year is None:
     st.warning(" Please select a year to continue.")
     st.stop()
-# DataFrame
-production_df = get_production_data(year)
+# Areas and groups available in the selected year (hourly rows are loaded after selection)
+series_df = get_aggregated_data("production", group_by=["priceArea", "productionGroup"],
+                                aggs={"hours": "count"}, year=year)
 
 
 ### TAB-1 FUNCTION ###
 
 # Function for STL decomposition with Plotly
 def stl_loess(production_df, priceArea='NO1', productionGroup='hydro', 
-                     period=720, seasonal_smoother=723, trend_smoother=723, robust=True):
+                     period=720, seasonal_smoother=723, trend_smoother=723, robust=True, window=None):
     
-    # Filter dataframe
-    df = production_df.copy()
-    if priceArea is not None:
-        df = df[df['priceArea'] == priceArea]
-    if productionGroup is not None:
-        df = df[df['productionGroup'] == productionGroup]
-
-    # Set datetime index
-    df = df.set_index('startTime')
+    # production_df holds only the selected series (filtered in the query), no copy needed
+    df = production_df.set_index('startTime')
     
-    # Run STL
-    stl = STL(df["quantityKwh"], period=period, seasonal=seasonal_smoother, 
-              trend=trend_smoother, robust=robust)
-    res = stl.fit()
+    # STL components from the memory/disk caches, a miss fits only this series
+    series = ("production", year, priceArea, productionGroup)
+    values = df["quantityKwh"].to_numpy()
+    # Exact STL when it fits the latency budget, the fast (interpolated LOESS) engine otherwise
+    engine = choose_stl_engine(len(values), period, seasonal_smoother, trend_smoother, robust)
+    with st.spinner("Decomposing..."):
+        components = stl_components(series, values, period, seasonal_smoother, trend_smoother, robust, engine)
+    res = pd.DataFrame(components, index=df.index)
         
     # Compute residual outliers (3-sigma rule)
-    threshold = 3 * np.std(res.resid)
-    outliers = (res.resid > threshold) | (res.resid < -threshold)
+    threshold = 3 * np.std(res["resid"])
+    outliers = (res["resid"] > threshold) | (res["resid"] < -threshold)
     
     # Prepare Plotly subplots: 4 rows, 1 column
     fig = make_subplots(rows=4, cols=1, shared_xaxes=True,
                         vertical_spacing=0.05,
                         subplot_titles=["Original", "Trend", "Seasonal", "Residual"])
     
+    # Traces are decimated to the plot width, or cut to the zoom window at full resolution
     # Original
-    fig.add_trace(go.Scatter(x=df.index, y=df["quantityKwh"], mode='lines', 
+    fig.add_trace(scatter(df.index, df["quantityKwh"], window, mode='lines', 
                              name='Original', line=dict(color='blue')), row=1, col=1)
     # Trend
-    fig.add_trace(go.Scatter(x=df.index, y=res.trend, mode='lines', 
+    fig.add_trace(scatter(df.index, res["trend"], window, mode='lines', 
                              name='Trend', line=dict(color='orange')), row=2, col=1)
     # Seasonal
-    fig.add_trace(go.Scatter(x=df.index, y=res.seasonal, mode='lines', 
+    fig.add_trace(scatter(df.index, res["seasonal"], window, mode='lines', 
                              name='Seasonal', line=dict(color='green')), row=3, col=1)
     # Residual
-    fig.add_trace(go.Scatter(x=df.index, y=res.resid, mode='markers', 
+    fig.add_trace(scatter(df.index, res["resid"], window, mode='markers', 
                              name='Residual', marker=dict(size=2,color='coral')), row=4, col=1)
     
     fig.update_layout(height=900, width=900, title_text=f"STL Decomposition - {selected_area}, {selected_group}",
@@ -78,36 +77,39 @@ def stl_loess(production_df, priceArea='NO1', productionGroup='hydro',
     #Information regarding STL decomposition
     info = { 
     "original":df["quantityKwh"].describe(),
-    "trend_stats": res.trend.describe(),
-    "seasonal_stats": res.seasonal.describe(),
-    "residual_stats": res.resid.describe(),
+    "trend_stats": res["trend"].describe(),
+    "seasonal_stats": res["seasonal"].describe(),
+    "residual_stats": res["resid"].describe(),
     "num_residual_outliers": outliers.sum(),
-    "data_length": len(df)}
+    "data_length": len(df),
+    "engine": engine}
     return fig, res,info
 
 ### Function for TAB-2 ###
 
 #Defining function to compute spectogram 
 def plot_spectrogram(priceArea='NO1', productionGroup='hydro',
-                            window_length=168, window_overlap=84):
-    df_spectogram = production_df.copy()
-    if priceArea is not None:
-        df_spectogram = df_spectogram[df_spectogram['priceArea'] == priceArea]
-    if productionGroup is not None:
-        df_spectogram = df_spectogram[df_spectogram['productionGroup'] == productionGroup]
-        
-    df_spectogram = df_spectogram.set_index('startTime')
-    data = df_spectogram["quantityKwh"].to_numpy()
-    time_index = df_spectogram.index
+                            window_length=168, window_overlap=84, window=None):
+    # The series of the given area and group, filtered in the query (a cached block for the selected one)
+    df = get_production_data(year, columns=["startTime", "quantityKwh"],
+                             filters={"priceArea": priceArea, "productionGroup": productionGroup})
+    data = df["quantityKwh"].to_numpy()
+    time_index = pd.DatetimeIndex(df["startTime"])
     fs = 24     
 
-    # Compute STFT
-    f, t, Zxx = stft(data, fs=fs, nperseg=window_length, noverlap=window_overlap)
+    # STFT, memoized on the series and window parameters and pooled to the plot's pixel grid
+    f, t, log_magnitude = spectrogram(data, fs, window_length, window_overlap)
+    log_magnitude = log_magnitude[0]
     
     #For x-axis to be in proper time format
     t_dates = time_index[0] + pd.to_timedelta(t, unit='D')
-    magnitude = np.abs(Zxx)
-    log_magnitude = np.log1p(magnitude)
+
+    # Segments inside the zoom window
+    keep = in_window(t_dates, window)
+    t_dates, log_magnitude = t_dates[keep], log_magnitude[:, keep]
+    # Cells of the unpooled STFT grid in the window, reported next to the cells sent
+    n_freqs, n_times = stft_shape(len(data), window_length, window_overlap)
+    cells_available = round(n_freqs * n_times * keep.mean()) if len(keep) else 0
 
     #  Plotly subplots
     fig = make_subplots(rows=2, cols=1,
@@ -115,13 +117,14 @@ def plot_spectrogram(priceArea='NO1', productionGroup='hydro',
         subplot_titles=("Production Quantity Over Time", "STFT Spectrogram"))
 
     # Actual data plot
-    fig.add_trace(go.Scatter(x=time_index, y=data, mode='lines', name='Quantity (kWh)'),
+    fig.add_trace(scatter(time_index, data, window, mode='lines', name='Quantity (kWh)'),
         row=1, col=1)
 
     # Spectrogram heatmap
     fig.add_trace(go.Heatmap(
             x=t_dates,y=f,z=log_magnitude,
-            colorscale='Viridis',colorbar=dict(title='Amplitude')),
+            colorscale='Viridis',colorbar=dict(title='Amplitude'),
+            meta={"points_available": cells_available}),
         row=2, col=1)
 
     # Update layout
@@ -136,13 +139,33 @@ def plot_spectrogram(priceArea='NO1', productionGroup='hydro',
     
     return fig
 
+#Spectrograms of one group in every price area, all areas in one batched STFT
+def plot_area_spectrograms(productionGroup='hydro', window_length=168, window_overlap=84):
+    df = get_production_data(year, columns=["priceArea", "startTime", "quantityKwh"],
+                             filters={"productionGroup": productionGroup})
+    wide = df.pivot_table(index="startTime", columns="priceArea", values="quantityKwh", aggfunc="sum").fillna(0)
+    f, t, log_magnitude = spectrogram(wide.to_numpy(dtype=np.float32).T, 24, window_length, window_overlap)
+    t_dates = wide.index[0] + pd.to_timedelta(t, unit='D')
+
+    fig = make_subplots(rows=len(wide.columns), cols=1, shared_xaxes=True, vertical_spacing=0.04,
+                        subplot_titles=list(wide.columns))
+    for i, area in enumerate(wide.columns):
+        fig.add_trace(go.Heatmap(x=t_dates, y=f, z=log_magnitude[i], coloraxis="coloraxis", name=area),
+                      row=i + 1, col=1)
+
+    fig.update_layout(height=220 * len(wide.columns) + 100,
+        title_text=f'STFT Spectrograms of {productionGroup} per Price Area',
+        coloraxis=dict(colorscale='Viridis', colorbar=dict(title='Amplitude')))
+    fig.update_xaxes(tickformat='%Y-%m', tickangle=45)
+    return fig
+
 #st.write('Session state area:',st.session_state.selected_price_area)
 
 #Coulmns common to both tabs to add UI elements
 col1,col2=st.columns(2)
 with col1:
     # Get unique price areas from your dataframe
-    price_area = sorted(production_df['priceArea'].unique())
+    price_area = sorted(series_df['priceArea'].unique())
     # Set default area explicitly to "NO1"
     selected_area = st.pills("Select Price Area", price_area, default="NO1")
     # Show selection (None until user clicks)
@@ -152,12 +175,15 @@ with col1:
     #st.write("Selected area for this page only:", selected_area)
 
 with col2:
-    production_group=sorted(production_df['productionGroup'].unique())
+    production_group=sorted(series_df['productionGroup'].unique())
     default_group='hydro'
     default_index_group=production_group.index(default_group) if default_group in production_group else 0
     #Add selectbox for user to select production group
     selected_group = st.selectbox("Select Production Group", production_group,index=default_index_group)
 
+# DataFrame of the selected series only, area and group are filtered in the query
+production_df = get_production_data(year, columns=["priceArea", "productionGroup", "startTime", "quantityKwh"],
+                                    filters={"priceArea": selected_area, "productionGroup": selected_group})
 
 # Creating tabs 
 tab1,tab2 = st.tabs(["Tab-1","Tab-2"])
@@ -181,8 +207,14 @@ with tab1:
 
     #Function call
     fig1,res1,info=stl_loess(production_df, priceArea=selected_area, productionGroup=selected_group, 
-                     period=period_hours, seasonal_smoother=seasonal_smoother, trend_smoother=trend_smoother, robust=selected_robust )
-    st.plotly_chart(fig1, use_container_width=True)
+                     period=period_hours, seasonal_smoother=seasonal_smoother, trend_smoother=trend_smoother, robust=selected_robust,
+                     window=zoom_window("stl_chart"))
+    show_chart(fig1, "stl_chart")
+    if info["engine"] == "fast":
+        # Measured against the exact fit in stl_utils: robust fits drift up to about 2 % at long periods
+        tolerance = "2 %" if selected_robust else "0.5 %"
+        st.caption("Long period: decomposed with the fast STL engine (LOESS interpolated between every "
+                   f"10th window point), components within about {tolerance} of the exact fit.")
     #st.write('Summary',info)
 
 with tab2:
@@ -201,7 +233,17 @@ with tab2:
         max_value=window_length - 1,  # dynamically limits overlap to less than window length
         value=default_overlap,step=12)
 
+    compare_areas = st.checkbox(f"Compare {selected_group} spectrograms across all price areas")
+
     #Function call
-    fig1 = plot_spectrogram(priceArea=selected_area,productionGroup=selected_group,window_length=window_length,window_overlap=window_overlap)
+    if compare_areas:
+        fig1 = plot_area_spectrograms(productionGroup=selected_group, window_length=window_length,
+                                      window_overlap=window_overlap)
+    else:
+        fig1 = plot_spectrogram(priceArea=selected_area,productionGroup=selected_group,window_length=window_length,window_overlap=window_overlap,
+                                window=zoom_window("spectrogram_chart"))
     # Display figure in Streamlit
-    st.plotly_chart(fig1, use_container_width=True)
+    if compare_areas:
+        st.plotly_chart(fig1, use_container_width=True)
+    else:
+        show_chart(fig1, "spectrogram_chart")
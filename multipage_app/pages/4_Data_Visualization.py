@@ -3,21 +3,33 @@ import calendar
 import streamlit as st
 import altair as alt
 from datetime import date
-import plotly.express as px
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
 
+from plot_utils import lines, show_chart, zoom_window
 
-from utils import DATA,api_call, get_coords_by_price_code, area_name
+
+from utils import (DATA, WEATHER_VARIABLES, WEATHER_CUBE_YEARS, api_call, month_rows, daily_by_year,
+                   weather_store, weather_cell, get_coords_by_price_code, area_name)
 
 st.markdown(" ## Weather Data Insights")
 st.markdown(""" Explore normalized weather data from 2000-2024. Select price area, months and weather variables to visualize trends over time.""")
 
+# One year of hourly data, or daily values of several years against a climatology baseline
+view = st.radio("View:", ["Single year", "Compare years"], horizontal=True)
+
 col1,col2=st.columns(2)
 with col1:
-    year = st.number_input("Select year",
-            min_value=2000,
-            max_value=2024,
-            value=2021,
-            step=1)
+    if view == "Single year":
+        year = st.number_input("Select year",
+                min_value=2000,
+                max_value=2024,
+                value=2021,
+                step=1)
+    else:
+        year_range = st.slider("Select years:", min_value=WEATHER_CUBE_YEARS[0], max_value=WEATHER_CUBE_YEARS[1],
+                               value=WEATHER_CUBE_YEARS)
 with col2:
 # Let the user select a Price Area  by city name
     selected_price_area = st.selectbox("Select a Price Area:",
@@ -28,6 +40,47 @@ with col2:
 # Get coordinates from utils
 coords = get_coords_by_price_code(selected_price_area)
 
+
+#Function for the year comparison: daily values of each compared year over the 10-90 % band
+#and median of all years in the range, all sliced from the weather cube
+def plot_years(cell, first_year, last_year, variable, compared_years):
+    daily = daily_by_year(cell, first_year, last_year, variable)
+    day_axis = pd.date_range("2001-01-01", periods=365, freq="D")  # a year without 29 February
+    low, median, high = np.nanpercentile(daily, [10, 50, 90], axis=0)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=day_axis, y=high, mode='lines', line=dict(width=0),
+                             showlegend=False, hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=day_axis, y=low, mode='lines', line=dict(width=0), fill='tonexty',
+                             fillcolor='rgba(150,150,150,0.3)', name=f'10-90 % {first_year}-{last_year}'))
+    fig.add_trace(go.Scatter(x=day_axis, y=median, mode='lines', line=dict(color='grey', dash='dash'),
+                             name=f'Median {first_year}-{last_year}'))
+    for compared_year in compared_years:
+        fig.add_trace(go.Scatter(x=day_axis, y=daily[compared_year - first_year], mode='lines',
+                                 name=str(compared_year)))
+    fig.update_layout(title=f"Daily {variable} against the {first_year}-{last_year} climatology",
+                      xaxis_title="Day of year", yaxis_title=variable, xaxis_tickformat="%b",
+                      height=450, hovermode="x unified", template="plotly_white")
+    return fig
+
+
+if view == "Compare years":
+    first_year, last_year = year_range
+    cell = weather_cell(*coords)
+    # Prebuilt for the DATA cities by scripts/build_weather_cube.py, otherwise only missing days are fetched
+    store = weather_store()
+    for lo, hi in store.iter_fill([cell], date(first_year, 1, 1), date(last_year, 12, 31)):
+        st.success(f"Data for {lo:%d %b %Y} to {hi:%d %b %Y} loaded successfully")
+
+    col1,col2=st.columns(2)
+    with col1:
+        variable = st.selectbox('Choose weather variable:', WEATHER_VARIABLES)
+    with col2:
+        compared_years = st.multiselect("Years to compare:", list(range(first_year, last_year + 1)),
+                                        default=[last_year])
+    st.plotly_chart(plot_years(cell, first_year, last_year, variable, compared_years), use_container_width=True)
+    st.stop()
+
 # Call the API
 df= api_call(coords, year)
 
@@ -35,21 +88,13 @@ df= api_call(coords, year)
 months = list(calendar.month_name)[1:]
 month_range = st.select_slider('Select a range of months:',options=months,value=('January', 'January'))
 
-#Finding all selected months from the slider
-start_month = months.index(month_range[0])
-end_month = months.index(month_range[1])
-selected_months = months[start_month:end_month + 1]
+#Rows of the selected months range, found by binary search on the sorted hourly times
+rows = month_rows(df['date'].to_numpy(), months.index(month_range[0]) + 1, months.index(month_range[1]) + 1)
 
-#Creating a month name column from dataframe time column
-df['time'] = (df['date'])
-df['month'] = df['time'].dt.month_name()
-
-#Converting wide format to long format data so its easy to use altair
-columns = [column for column in df.columns if column not in ['time','month','date']]
-df_melted = df.melt(id_vars=['time','month'],value_vars=columns,var_name='variable',value_name='value' )
-
-#Filtering dataframe for selected months range
-df_selected=df_melted[df_melted['month'].isin(selected_months)]
+#Wide float32 arrays of the selected rows, one column per weather variable (slices, no copies)
+columns = [column for column in df.columns if column != 'date']
+times = df['date'].to_numpy()[rows]
+values = {column: df[column].to_numpy()[rows] for column in columns}
 
 # Creating a selectbox of numeric columns
 option = ["-- Select --"] + columns + ['All variables']
@@ -62,21 +107,12 @@ if selected_option == 'All variables':
     st.write(f"You selected: {selected_option}")
     st.text(" ")
 
-    # Plotly line chart for all variables
-    fig_all = px.line(
-        df_selected,
-        x="time",
-        y="value",
-        color="variable",
-        title=f"Graph of {selected_option} over Year 2021",
-        labels={
-            "time": "Year 2021",
-            "value": "Weather data over 2021",
-            "variable": "Variables"
-        }
-    )
+    # Plotly line chart for all variables, one trace per column
+    fig_all = lines(times, values, window=zoom_window("weather_all"),
+        title=f"Graph of {selected_option} over Year {year}",
+        xaxis_title=f"Year {year}", yaxis_title=f"Weather data over {year}", legend_title="Variables")
     fig_all.update_layout(width=800, height=400, hovermode="x unified")
-    st.plotly_chart(fig_all, use_container_width=True)
+    show_chart(fig_all, "weather_all")
     st.markdown('<span style="color:blue;">Hover over the chart to inspect specific values.</span>', unsafe_allow_html=True)
 
 # Creating plot of each column
@@ -84,23 +120,12 @@ elif selected_option != "-- Select --":
     st.write(f"You selected: {selected_option}")
     st.text(" ")
 
-    df_col = df_selected[df_selected['variable'] == selected_option]
-
     # Plotly line chart for single variable
-    fig_col = px.line(
-        df_col,
-        x="time",
-        y="value",
-        color="variable",
-        title=f"Graph of {selected_option} over Year 2021",
-        labels={
-            "time": "Year 2021",
-            "value": selected_option,
-            "variable": "Variable"
-        }
-    )
+    fig_col = lines(times, {selected_option: values[selected_option]}, window=zoom_window("weather_col"),
+        title=f"Graph of {selected_option} over Year {year}",
+        xaxis_title=f"Year {year}", yaxis_title=selected_option, legend_title="Variable", showlegend=True)
     fig_col.update_layout(width=800, height=400, hovermode="x unified")
-    st.plotly_chart(fig_col, use_container_width=True)
+    show_chart(fig_col, "weather_col")
     st.markdown('<span style="color:blue;">Hover over the chart to inspect specific values.</span>', unsafe_allow_html=True)
 
 else:
@@ -1,12 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from scipy.fftpack import dct, idct
 import plotly.graph_objects as go
 from sklearn.neighbors import LocalOutlierFactor
 import scipy.stats as stats
 
-from utils import DATA,api_call, get_coords_by_price_code, area_name
+from utils import (DATA, WEATHER_CUBE_YEARS, api_call, weather_store, weather_cell, get_coords_by_price_code,
+                   area_name)
+from plot_utils import scatter, show_chart, zoom_window
+from spc_utils import spc_outliers, outlier_table
 
 st.markdown(' ## Outlier and Anomaly Detection in Weather Data ')
 st.text('This page presents temperature values that fall outside expected ranges and ' \
@@ -42,56 +44,34 @@ tab1, tab2 = st.tabs(["Tab 1", "Tab 2"])
 
 # Temperature outliers function using df_city
 # dct_cutoff_hours: Default for weekly values
-def temp_outliers(df_city, dct_cutoff_hours=168, n_std=3):
+def temp_outliers(df_city, dct_cutoff_hours=168, n_std=3, window=None):
     # Original temperature converted to numpy array to pass to DCT
     temp = df_city['temperature_2m'].to_numpy(dtype=float)
     dates = pd.to_datetime(df_city['date'])
 
-    # DCT type 2
     N = len(temp)
-    temp_dct = dct(temp, type=2, norm='ortho')
 
     # Computing sampling interval automatically from timestamps
     sampling_interval_hours = (dates[1] - dates[0]).total_seconds() / 3600.0
 
-    # Cutoff index mapping
-    k_cut = int((N * sampling_interval_hours) / dct_cutoff_hours)
+    # DCT high-pass (SATV), MAD-based bounds and the low frequency baseline, as a batch of one series
+    spc = spc_outliers(temp, dct_cutoff_hours, n_std, sampling_interval_hours)
+    outliers_mask = spc["mask"][0]
 
-    # High-pass filtering and SATV
-    temp_dct_hp = temp_dct.copy()
-    temp_dct_hp[:k_cut] = 0
-    temp_satv = idct(temp_dct_hp, type=2, norm='ortho')
+    # SPC boundaries around the low frequency DCT baseline
+    upper_thresh_orig = spc["baseline"][0] + spc["median"][0] + n_std * spc["robust_std"][0]
+    lower_thresh_orig = spc["baseline"][0] + spc["median"][0] - n_std * spc["robust_std"][0]
 
-    # Robust statistics using MAD
-    median_val = np.median(temp_satv)
-    mad = np.median(np.abs(temp_satv - median_val))
-    robust_std_val = 1.4826 * mad
-
-    # SPC boundaries
-    upper_bound = median_val + n_std * robust_std_val
-    lower_bound = median_val - n_std * robust_std_val
-
-    # Identify outliers beyond the SPC boundaries
-    outliers_mask = (temp_satv > upper_bound) | (temp_satv < lower_bound)
-
-    # Low frequency DCT to plot boundaries
-    temp_dct_low = temp_dct.copy()
-    temp_dct_low[k_cut:] = 0
-    temp_lowfreq = idct(temp_dct_low, type=2, norm='ortho')
-
-    upper_thresh_orig = temp_lowfreq + upper_bound
-    lower_thresh_orig = temp_lowfreq + lower_bound
-
-    # Plotting
+    # Plotting, lines decimated to the plot width or cut to the zoom window at full resolution
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=dates, y=temp,
+    fig.add_trace(scatter(dates, temp, window,
         mode='lines', name='Temperature', line=dict(color='royalblue')))
-    fig.add_trace(go.Scatter(x=dates[outliers_mask], y=temp[outliers_mask],
+    fig.add_trace(scatter(dates[outliers_mask], temp[outliers_mask], window,
         mode='markers', name='Outliers', marker=dict(color='red', size=5)))
-    fig.add_trace(go.Scatter(x=dates, y=upper_thresh_orig,
+    fig.add_trace(scatter(dates, upper_thresh_orig, window,
         mode='lines', name='Upper SPC Boundary',
         line=dict(color='orange', dash='dashdot')))
-    fig.add_trace(go.Scatter(x=dates, y=lower_thresh_orig,
+    fig.add_trace(scatter(dates, lower_thresh_orig, window,
         mode='lines', name='Lower SPC Boundary',
         line=dict(color='orange', dash='dashdot')))
 
@@ -148,6 +128,12 @@ def precipitation_anomalies(df,n_neighbors=20, outlier_proportion=0.01):
         - Number of outliers: {np.sum(outliers)}"""
         return fig, summary
 
+#Outlier table of all DATA cities over the weather cube years, read from disk after the first build
+@st.cache_data(show_spinner="Detecting temperature outliers for every city and year...")
+def all_temp_outliers(cutoff_hours, n_std):
+    cells = {city: weather_cell(info['Latitude'], info['Longitude']) for city, info in DATA.items()}
+    return outlier_table(weather_store(), cells, *WEATHER_CUBE_YEARS, cutoff_hours, n_std)
+
 with tab1:
     st.markdown('### Temperature Outliers (SATV)')
     col1,col2=st.columns(2)
@@ -162,10 +148,25 @@ with tab1:
         step=24)           # change in 1-day increments
 
     #Call function
-    fig,summary = temp_outliers(df_city, dct_cutoff_hours=cutoff_hours, n_std=n_std) #default value is 3 from slider
-    st.plotly_chart(fig, use_container_width=True,)
+    fig,summary = temp_outliers(df_city, dct_cutoff_hours=cutoff_hours, n_std=n_std, #default value is 3 from slider
+                                window=zoom_window("temp_outliers_chart"))
+    show_chart(fig, "temp_outliers_chart")
     st.write(summary)
 
+    #Nationwide table: every city and year in one batched DCT, stored per (cutoff, n_std) and then only filtered
+    first_year, last_year = WEATHER_CUBE_YEARS
+    if st.checkbox(f"Show all temperature outliers {first_year}-{last_year} for every city"):
+        table = all_temp_outliers(cutoff_hours, n_std)
+        col1,col2=st.columns(2)
+        with col1:
+            cities = st.multiselect("Cities:", list(DATA), default=list(DATA))
+        with col2:
+            years = st.slider("Years:", min_value=first_year, max_value=last_year, value=(first_year, last_year))
+        selected = table[table["city"].isin(cities) & table["year"].between(*years)]
+        st.markdown(f"**{len(selected)} outlier hours**, per year and city:")
+        st.dataframe(pd.crosstab(selected["year"], selected["city"]), use_container_width=True)
+        st.dataframe(selected, hide_index=True, use_container_width=True)
+
 with tab2:
     st.markdown("### Precipitation Anomaly Detection (LOF)")
     col1,col2=st.columns(2)
@@ -1,24 +1,13 @@
 import streamlit as st
 import pymongo
 import pandas as pd
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import folium
-import geopandas as gpd
-from shapely.geometry import Point
 from streamlit_folium import st_folium
 import numpy as np
-import os 
-from utils import get_production_data, get_consumption_data
-
-# Load GeoJSON 
-@st.cache_data
-def load_geojson(path):
-    gdf = gpd.read_file(path)
-    gdf = gdf.to_crs(epsg=4326)
-    return gdf
-
-geojson_path = os.path.join(os.path.dirname(__file__), "maps_area.geojson")
-gdf = load_geojson(geojson_path)
+import time
+from utils import get_range_totals
+from geo_utils import price_area_index, price_area_level, area_level_for_zoom, area_layer, legend_html
 
 #Initialize session state for clicks
 if "clicked_points" not in st.session_state:
@@ -38,42 +27,44 @@ st.text("Click on the map to store coordinates and highlight the corresponding P
 # Columns for map and data type
 col1, col2 = st.columns([2, 1])
 
-#Base map (single instance) 
-m = folium.Map(location=[65, 15], zoom_start=4)
-
-# Add GeoJSON outlines
-folium.GeoJson(
-    gdf,
-    name="Price Area Outlines",
-    style_function=lambda feature: {
-        'fillColor': 'transparent',
-        'color': 'blue',
-        'weight': 3,
-        'fillOpacity': 0.0
-    },
-    tooltip=folium.GeoJsonTooltip(fields=["ElSpotOmr"], aliases=["Price Area"])
-).add_to(m)
-
-# Highlight selected Price Area
-if st.session_state.selected_area:
-    selected_gdf = gpd.GeoDataFrame(geometry=[st.session_state.selected_area], crs="EPSG:4326")
-    folium.GeoJson(
-        selected_gdf,
-        name="Selected Area Outline",
-        style_function=lambda feature: {
-            'fillColor': 'transparent',
-            'color': 'cyan',
-            'weight': 5,
-            'fillOpacity': 0.1
-        }
-    ).add_to(m)
-
-# Add markers for stored points
-for point in st.session_state.clicked_points:
-    folium.Marker(
-        location=[point["lat"], point["lon"]],
-        popup=point["area"]
-    ).add_to(m)
+# Map state: clicks and zoom are handled in the st_folium callback, and only the overlay
+# (areas, choropleth, highlight, markers) changes between reruns
+MAP_KEY = "price_area_map"
+if "map_zoom" not in st.session_state:
+    st.session_state.map_zoom = 4
+if "last_click" not in st.session_state:
+    st.session_state.last_click = None
+    st.session_state.click_started = None
+
+
+def base_map():
+    # Static tiles and view. Built fresh on every run: st_folium adds the overlay to the map
+    # it is given, so a shared map would carry earlier runs' (and sessions') overlays.
+    # streamlit-folium renames the map div, so the script is identical between reruns.
+    return folium.Map(location=[65, 15], zoom_start=4)
+
+
+def handle_map_change():
+    # Runs before the rerun, so a click is drawn by the same run that handles it
+    map_data = st.session_state[MAP_KEY] or {}
+    if map_data.get("zoom") is not None:
+        st.session_state.map_zoom = map_data["zoom"]
+
+    latlon = map_data.get("last_clicked")
+    if latlon and latlon != st.session_state.last_click:
+        st.session_state.last_click = latlon
+        st.session_state.click_started = time.perf_counter()
+        lat, lon = latlon["lat"], latlon["lng"]
+
+        # Spatial index lookup on simplified polygons
+        area_name, selected_geom = price_area_index().area_of(lat, lon)
+
+        st.session_state.clicked_points.append({"lat": lat, "lon": lon, "area": area_name})
+        st.session_state.selected_area = area_name if selected_geom is not None else None
+
+
+# Values of the choropleth, filled in by the controls
+mean_values, bins = None, None
 
 #Controls in right column
 with col2:
@@ -106,16 +97,16 @@ with col2:
         st.write("Selected interval:", start_date, "to", end_date)
         # Convert to datetime for database queries
         if start_date is not None and end_date is not None:
+            # Half-open [start, end) range that includes the whole end date
             start_dt = datetime.combine(start_date, datetime.min.time())  
-            end_dt = datetime.combine(end_date, datetime.max.time()) 
+            end_dt = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
             
-            #  Load only the selected slice
+            #  Per area/group sums and counts of the selected range, two prefix-sum lookups each
             if energy_type == "Energy Production":
-                df = get_production_data(start_date=start_dt, end_date=end_dt)
-                group_col = "productionGroup"
+                dataset, group_col = "production", "productionGroup"
             else:
-                df = get_consumption_data(start_date=start_dt, end_date=end_dt)
-                group_col = "consumptionGroup"
+                dataset, group_col = "consumption", "consumptionGroup"
+            df = get_range_totals(dataset, start_dt, end_dt)
 
             #  Group selection and visualization
             if not df.empty:
@@ -129,69 +120,41 @@ with col2:
 
                 if not group_df.empty:
                     
+                    # Hourly mean per area = total sum / total count over the selected groups
+                    area_totals = group_df.groupby("priceArea")[["quantityKwh_sum", "quantityKwh_count"]].sum()
                     mean_values = (
-                        group_df.groupby("priceArea")["quantityKwh"]
-                        .mean()
+                        (area_totals["quantityKwh_sum"] / area_totals["quantityKwh_count"])
+                        .rename("quantityKwh")
                         .reset_index()
                     )
                     
-                    gdf = gdf.copy()
-                    gdf["join_key"] = gdf["ElSpotOmr"].str.replace(" ", "")
-                    gdf = gdf.merge(mean_values, left_on="join_key", right_on="priceArea", how="left")
-
                     bins = list(np.linspace(mean_values["quantityKwh"].min(),
                                             mean_values["quantityKwh"].max(), 6))
 
-                    folium.Choropleth(
-                        geo_data=gdf,
-                        name="Energy Choropleth",
-                        data=mean_values,
-                        columns=["priceArea", "quantityKwh"],
-                        key_on="feature.properties.join_key",
-                        fill_color="YlOrRd",
-                        fill_opacity=0.6,
-                        line_opacity=0.8,
-                        legend_name="Mean Energy (kWh)",
-                        nan_fill_color="transparent",
-                        bins=bins,
-                        legend_position="bottomright"
-                    ).add_to(m)
-
-                    folium.GeoJson(
-                        gdf,
-                        name="Price Area Tooltip",
-                        style_function=lambda feature: {
-                            'fillColor': 'transparent',
-                            'color': 'blue',
-                            'weight': 1,
-                            'fillOpacity': 0.0
-                        },
-                        tooltip=folium.GeoJsonTooltip(
-                            fields=["ElSpotOmr", "quantityKwh"],
-                            aliases=["Price Area", "Mean kWh"],
-                            labels=True,
-                            sticky=True,
-                            style="background-color: white; color: #333; font-size: 12px; padding: 5px;"
-                        )
-                    ).add_to(m)
-
-# Render map once in left column to add choropleth
-with col1:
-    map_data = st_folium(m, width=700, height=500)
-
-    # Capture click
-    if map_data and map_data.get("last_clicked"):
-        latlon = map_data["last_clicked"]
-        lat, lon = latlon["lat"], latlon["lng"]
-        clicked_point = Point(lon, lat)
-
-        match = gdf[gdf.contains(clicked_point)]
-        area_name = match.iloc[0]["ElSpotOmr"] if not match.empty else "Outside defined areas"
-        selected_geom = match.iloc[0].geometry if not match.empty else None
+# Overlay with one layer holding outlines, choropleth, highlight and tooltip at the
+# geometry level of the current zoom, plus a marker per stored point
+overlay = folium.FeatureGroup(name="Price Areas")
+areas = price_area_level(area_level_for_zoom(st.session_state.map_zoom))
+values = None if mean_values is None else dict(zip(mean_values["priceArea"], mean_values["quantityKwh"]))
+layer, colormap = area_layer(areas, values, bins, selected=st.session_state.selected_area)
+layer.add_to(overlay)
+for point in st.session_state.clicked_points:
+    folium.Marker(
+        location=[point["lat"], point["lon"]],
+        popup=point["area"]
+    ).add_to(overlay)
 
-        st.session_state.clicked_points.append({"lat": lat, "lon": lon, "area": area_name})
-        st.session_state.selected_area = selected_geom
-        st.rerun()
+# Render map once in left column
+with col1:
+    st_folium(base_map(), key=MAP_KEY, width=700, height=500, feature_group_to_add=overlay,
+              returned_objects=["last_clicked", "zoom"], on_change=handle_map_change)
+    if colormap is not None:
+        st.html(legend_html(colormap))
+
+    # Server time from receiving a click to the updated map being sent
+    if st.session_state.click_started is not None:
+        st.caption(f"Click handled in {(time.perf_counter() - st.session_state.click_started) * 1000:.0f} ms")
+        st.session_state.click_started = None
 
     # Show clicked points
     if st.session_state.clicked_points:
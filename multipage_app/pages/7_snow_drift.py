@@ -1,18 +1,15 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import openmeteo_requests
-import requests_cache
-from retry_requests import retry
+from datetime import date
 import plotly.express as px
 import plotly.graph_objects as go
 
-# Code source: Provided by Sir (IND-320)
+from utils import weather_store, weather_cell
+from snow_utils import (snow_season_sums, results_from_sums, snow_transport_sweep,
+                        load_climatology, climatology_sums)
 
-# Setup Open-Meteo API client with cache and retry
-cache_session = requests_cache.CachedSession('.cache', expire_after=-1)
-retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-openmeteo = openmeteo_requests.Client(session=retry_session)
+# Code source: Provided by Sir (IND-320)
 
 st.title(" Snow Drift Analysis")
 st.text('Here you can visualize annual snow drift for a selected range of years (2000-2024), based on chosen map coordinates. ' \
@@ -20,105 +17,41 @@ st.text('Here you can visualize annual snow drift for a selected range of years
 
 # Helper Functions 
 
-def compute_Qupot(hourly_wind_speeds, dt=3600):
-    return sum((u ** 3.8) * dt for u in hourly_wind_speeds) / 233847
-
-def sector_index(direction):
-    return int(((direction + 11.25) % 360) // 22.5)
-
-def compute_sector_transport(hourly_wind_speeds, hourly_wind_dirs, dt=3600):
-    sectors = [0.0] * 16
-    for u, d in zip(hourly_wind_speeds, hourly_wind_dirs):
-        idx = sector_index(d)
-        sectors[idx] += ((u ** 3.8) * dt) / 233847
-    return sectors
-
-def compute_snow_transport(T, F, theta, Swe, hourly_wind_speeds, dt=3600):
-    Qupot = compute_Qupot(hourly_wind_speeds, dt)
-    Qspot = 0.5 * T * Swe
-    Srwe = theta * Swe
-    if Qupot > Qspot:
-        Qinf = 0.5 * T * Srwe
-        control = "Snowfall controlled"
-    else:
-        Qinf = Qupot
-        control = "Wind controlled"
-    Qt = Qinf * (1 - 0.14 ** (F / T))
-    return {"Qupot (kg/m)": Qupot, "Qspot (kg/m)": Qspot, "Srwe (mm)": Srwe,
-            "Qinf (kg/m)": Qinf, "Qt (kg/m)": Qt, "Control": control}
-
-def compute_yearly_results(df, T, F, theta):
-    results_list = []
-    df['year'] = df['time'].dt.year
-    years = sorted(df['year'].unique())
-    for y in years:
-        start = pd.Timestamp(year=y, month=7, day=1)
-        end = pd.Timestamp(year=y+1, month=6, day=30, hour=23, minute=59)
-        df_season = df[(df['time'] >= start) & (df['time'] <= end)]
-        if df_season.empty:
-            continue
-        df_season = df_season.copy()
-        df_season['Swe_hourly'] = df_season.apply(
-            lambda row: row['precipitation'] if row['temperature_2m'] < 1 else 0, axis=1
-        )
-        total_Swe = df_season['Swe_hourly'].sum()
-        wind_speeds = df_season['wind_speed_10m'].tolist()
-        result = compute_snow_transport(T, F, theta, total_Swe, wind_speeds)
-        result["snow_year"] = f"July {y} – June {y+1}"
-        results_list.append(result)
-    return pd.DataFrame(results_list)
-
-def compute_monthly_results(df, T, F, theta):
-    df = df.copy()
-    df["month"] = df["time"].dt.month
-    df["year"] = df["time"].dt.year
-    # Snow season runs July–June; assign months Jan–Jun to previous year
-    df["snow_season_year"] = df.apply(
-        lambda r: r["year"] - 1 if r["month"] <= 6 else r["year"], axis=1
-    )
+@st.cache_resource
+def snow_climatology():
+    # Built offline by scripts/build_snow_climatology.py, None if it has not been built
+    return load_climatology()
 
-    monthly_results = []
-    for (season_year, month), df_month in df.groupby(["snow_season_year", "month"]):
-        df_month = df_month.copy()
-        df_month["Swe_hourly"] = df_month.apply(
-            lambda row: row["precipitation"] if row["temperature_2m"] < 1 else 0, axis=1
-        )
-        total_Swe = df_month["Swe_hourly"].sum()
-        wind_speeds = df_month["wind_speed_10m"].tolist()
-        result = compute_snow_transport(T, F, theta, total_Swe, wind_speeds)
 
-        month_name = pd.to_datetime(str(month), format="%m").strftime("%B")
-        result["Period"] = f"{month_name} {season_year}"
-        result["Qt (tonnes/m)"] = result["Qt (kg/m)"] / 1000
-        result["Type"] = "Monthly"
-        monthly_results.append(result)
+@st.cache_data
+def cell_season_sums(cell, first_season, last_season):
+    # Sufficient sums of a cell, so changing T, F or theta never touches the hourly data
+    clim = snow_climatology()
+    sums = None if clim is None else climatology_sums(clim, cell, first_season, last_season)
+    if sums is None:
+        df = weather_store().frame(cell, date(first_season, 7, 1), date(last_season + 1, 6, 30))
+        sums = snow_season_sums(df.rename(columns={"date": "time"}))
+    return sums
 
-    return pd.DataFrame(monthly_results)
 
+def plot_sensitivity(sums, T, F, theta):
+    T_values = np.linspace(500, 6000, 56)
+    F_values = np.linspace(5000, 60000, 56)
+    surface = snow_transport_sweep(sums, T_values, F_values, [theta])[:, :, 0] / 1000
+
+    fig = go.Figure(go.Contour(
+        z=surface, x=F_values, y=T_values, colorscale="Blues",
+        colorbar=dict(title="Mean Qt (tonnes/m)")
+    ))
+    fig.add_trace(go.Scatter(x=[F], y=[T], mode="markers", marker=dict(color="red", size=10),
+                             name="Selected"))
+    fig.update_layout(
+        title=f"Mean yearly snow drift for theta = {theta:.2f}",
+        xaxis_title="Fetch distance F (m)", yaxis_title="Max transport distance T (m)",
+        showlegend=False
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
-def compute_average_sector(df):
-    sectors_list = []
-    df['year'] = df['time'].dt.year
-    years = sorted(df['year'].unique())
-    
-    for y in years:
-        start = pd.Timestamp(year=y, month=7, day=1)
-        end = pd.Timestamp(year=y+1, month=6, day=30, hour=23, minute=59)
-        
-        df_season = df[(df['time'] >= start) & (df['time'] <= end)]
-        if df_season.empty:
-            continue
-        
-        df_season = df_season.copy()
-        df_season['Swe_hourly'] = df_season.apply(
-            lambda row: row['precipitation'] if row['temperature_2m'] < 1 else 0, axis=1
-        )
-        ws = df_season['wind_speed_10m'].tolist()
-        wdir = df_season['wind_direction_10m'].tolist()
-        sectors_list.append(compute_sector_transport(ws, wdir))
-    
-    avg_sectors = np.mean(sectors_list, axis=0)
-    return avg_sectors
 
 def plot_rose_plotly(avg_sector_values, overall_avg):
     num_sectors = 16
@@ -154,40 +87,6 @@ def plot_rose_plotly(avg_sector_values, overall_avg):
     
     st.plotly_chart(fig, use_container_width=True)
 
-#API Call for 1 July to 30 June
-@st.cache_data(show_spinner=False)
-def get_weather_api(lat, lon, year):
-    start_date = f"{year}-07-01"
-    end_date = f"{year+1}-06-30"
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "start_date": start_date,
-        "end_date": end_date,
-        "hourly": ["temperature_2m", "precipitation", "wind_speed_10m","wind_gusts_10m", "wind_direction_10m"],
-        "models": "era5"
-    }
-    response = openmeteo.weather_api(url, params=params)[0]
-    hourly = response.Hourly()
-    
-    hourly_data = {
-        "time": pd.date_range(
-            start=pd.to_datetime(hourly.Time(), unit="s", utc=True).tz_convert(None),
-            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True).tz_convert(None),
-            freq=pd.Timedelta(seconds=hourly.Interval()),
-            inclusive="left"
-        ),
-        "temperature_2m": hourly.Variables(0).ValuesAsNumpy(),
-        "precipitation": hourly.Variables(1).ValuesAsNumpy(),
-        "wind_speed_10m": hourly.Variables(2).ValuesAsNumpy(),
-        "wind_gusts_10m": hourly.Variables(3).ValuesAsNumpy(),
-        "wind_direction_10m": hourly.Variables(4).ValuesAsNumpy(),
-    }
-
-    df = pd.DataFrame(hourly_data)
-    return df
-
 # STREAMLIT UI
 
 if "clicked_points" not in st.session_state or not st.session_state.clicked_points:
@@ -206,24 +105,29 @@ else:
     year_range = st.slider("Select year range for analysis (start years):",
                            min_value=2000, max_value=2024, value=(2010, 2012))
 
-    snow_data_list = []
-    for y in range(year_range[0], year_range[1]):
-        df_year = get_weather_api(lat, lon, y)
-        snow_data_list.append(df_year)
-        st.success(f"Data for snow year {y}-{y+1} loaded successfully")
-
-    if snow_data_list:
-        df_all = pd.concat(snow_data_list, ignore_index=True)
-
-        T = 3000
-        F = 30000
-        theta = 0.5
-
-        # Compute results
-        yearly_results = compute_yearly_results(df_all, T, F, theta)
+    # Snow years run 1 July - 30 June. Cells in the precomputed climatology are answered
+    # from their stored season sums, otherwise only days missing from the weather store
+    # are fetched, as a few concurrent requests
+    if year_range[0] < year_range[1]:
+        cell = weather_cell(lat, lon)
+        clim = snow_climatology()
+        if clim is None or climatology_sums(clim, cell, year_range[0], year_range[1] - 1) is None:
+            store = weather_store()
+            for lo, hi in store.iter_fill([cell], date(year_range[0], 7, 1), date(year_range[1], 6, 30)):
+                st.success(f"Data for {lo:%d %b %Y} to {hi:%d %b %Y} loaded successfully")
+        sums = cell_season_sums(cell, year_range[0], year_range[1] - 1)
+        st.info(f"Selected location: {lat:.4f}, {lon:.4f} (weather from ERA5 grid cell {cell[0]:.2f}, {cell[1]:.2f})")
+
+        # Tabler parameters, every change is evaluated from the cached season sums
+        col_T, col_F, col_theta = st.columns(3)
+        T = col_T.slider("Max transport distance T (m)", 500, 6000, 3000, step=100)
+        F = col_F.slider("Fetch distance F (m)", 5000, 60000, 30000, step=1000)
+        theta = col_theta.slider("Relocation coefficient theta", 0.1, 1.0, 0.5, step=0.05)
+
+        # Yearly, monthly and directional results all come from the season sums
+        yearly_results, monthly_results, avg_sectors = results_from_sums(sums, T, F, theta)
         yearly_results_display = yearly_results[["snow_year", "Qt (kg/m)", "Control"]].copy()
         yearly_results_display["Qt (tonnes/m)"] = yearly_results_display["Qt (kg/m)"] / 1000
-        monthly_results = compute_monthly_results(df_all, T, F, theta)
 
         # UI selector
         plot_choice = st.radio(
@@ -297,10 +201,12 @@ else:
 
         # WIND ROSE
 
-        avg_sectors = compute_average_sector(df_all)
         overall_avg = yearly_results["Qt (kg/m)"].mean()
 
         st.subheader("Average Directional Distribution (Wind Rose)")
         plot_rose_plotly(avg_sectors, overall_avg)
 
+        with st.expander("Parameter sensitivity"):
+            plot_sensitivity(sums, T, F, theta)
+
         st.caption("Note: Code for this page was taken from Sir(Kristian Hovde Liland).")
@@ -2,15 +2,13 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import openmeteo_requests
 from datetime import date, datetime, timedelta
 import pymongo
-import requests_cache
-from retry_requests import retry
 import plotly.graph_objects as go
 
 
 from utils import api_call,get_production_data, get_consumption_data
+from plot_utils import scatter, show_chart, zoom_window
 
 #  STREAMLIT UI 
 st.header("Sliding window correlation")
@@ -32,8 +30,6 @@ lon = last_point["lon"]
 # Wrap lat/lon into a tuple
 coords = (lat, lon)
 
-st.info(f"Selected location: {lat:.4f}, {lon:.4f}")
-
 # Choose a year
 year = st.number_input("Select year for weather retrieval",
     min_value=2021,max_value=2024,value=2021)
@@ -41,10 +37,13 @@ year = st.number_input("Select year for weather retrieval",
 # Fetch weather data
 with st.spinner("Fetching weather data... (cached if previously loaded)"):
     df_weather = api_call(coords, year)
+    grid_lat, grid_lon = df_weather.attrs["grid_cell"]
     df_weather.set_index('date', inplace=True)
     df_weather.sort_index(inplace=True)
     st.success(f"Weather data successfully loaded from API for {year}!")
 
+st.info(f"Selected location: {lat:.4f}, {lon:.4f} (weather from ERA5 grid cell {grid_lat:.2f}, {grid_lon:.2f})")
+
 # Dataset selection 
 col1, col2 = st.columns([1, 1])
 with col1:
@@ -55,10 +54,10 @@ with col1:
         st.stop()
 
     if data_type == "Production":
-        df_energy = get_production_data()
+        df_energy = get_production_data(year, columns=["startTime", "quantityKwh"])
         st.success("Production data loaded!")
     elif data_type == "Consumption":
-        df_energy = get_consumption_data()
+        df_energy = get_consumption_data(year, columns=["startTime", "quantityKwh"])
         st.success("Consumption data loaded!")
 
 # Ensure time column is datetime and set as index
@@ -107,8 +106,8 @@ swc = df_weather_aligned[weather_col].rolling(window_size_hours, center=True).co
 
 # Plot SWC
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=swc.index, y=swc, mode='lines', name=f'SWC (lag={lag_hours}h)'))
+fig.add_trace(scatter(swc.index, swc, zoom_window("swc_chart"), mode='lines', name=f'SWC (lag={lag_hours}h)'))
 fig.update_layout(
     title=f"Sliding-window correlation ({window_size_hours}h) between {weather_col} and {energy_col} (lag={lag_hours}h)",
     xaxis_title="Time",yaxis_title="Correlation",yaxis=dict(range=[-1, 1]))
-st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+show_chart(fig, "swc_chart")
\ No newline at end of file
@@ -5,6 +5,7 @@ from statsmodels.tsa.statespace.sarimax import SARIMAX
 import plotly.graph_objects as go
 
 from utils import get_production_data, get_consumption_data
+from plot_utils import scatter, show_chart
 
 
 # STREAMLIT UI
@@ -25,10 +26,10 @@ if data_type is None:
     df, group_col = None, None
 else:
     if data_type == "Production":
-        df = get_production_data()
+        df = get_production_data(columns=["priceArea", "productionGroup", "startTime", "quantityKwh"])
         group_col = "productionGroup"
     else:
-        df = get_consumption_data()
+        df = get_consumption_data(columns=["priceArea", "consumptionGroup", "startTime", "quantityKwh"])
         group_col = "consumptionGroup"
 
     st.success(f"{data_type} data loaded!")
@@ -116,11 +117,13 @@ if st.button(" Fit SARIMAX Models and Forecasts"):
                 exog_train = pd.DataFrame(index=y_train.index)
                 for exog in selected_exog:
                     if exog == "Total Consumption":
-                        cons = get_consumption_data()
+                        cons = get_consumption_data(columns=["priceArea", "startTime", "quantityKwh"],
+                                                    filters={"priceArea": area})
                         cons['startTime'] = pd.to_datetime(cons['startTime']).dt.tz_localize(None)
                         series = cons[cons["priceArea"] == area].groupby("startTime")["quantityKwh"].sum()
                     elif exog == "Total Production":
-                        prod = get_production_data()
+                        prod = get_production_data(columns=["priceArea", "startTime", "quantityKwh"],
+                                                   filters={"priceArea": area})
                         prod['startTime'] = pd.to_datetime(prod['startTime']).dt.tz_localize(None)
                         series = prod[prod["priceArea"] == area].groupby("startTime")["quantityKwh"].sum()
                     else:
@@ -158,8 +161,8 @@ if st.button(" Fit SARIMAX Models and Forecasts"):
 
                 # Plot
                 fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=y_train.index, y=y_train.values,
+                fig.add_trace(scatter(
+                    y_train.index, y_train.values,
                     mode='lines', name='Training Data', line=dict(color='blue')
                 ))
                 fig.add_trace(go.Scatter(
@@ -177,7 +180,7 @@ if st.button(" Fit SARIMAX Models and Forecasts"):
                                   xaxis_title="Time", yaxis_title="quantityKwh",
                                   template="plotly_white")
 
-                st.plotly_chart(fig, use_container_width=True)
+                show_chart(fig)
 
 
     # Combined Forecast (Total Across Selection)
@@ -228,8 +231,8 @@ if st.button(" Fit SARIMAX Models and Forecasts"):
 
         # Plot
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=y_train.index, y=y_train.values,
+        fig.add_trace(scatter(
+            y_train.index, y_train.values,
             mode='lines', name='Training Data', line=dict(color='blue')
         ))
         fig.add_trace(go.Scatter(
@@ -247,4 +250,4 @@ if st.button(" Fit SARIMAX Models and Forecasts"):
                           xaxis_title="Time", yaxis_title="quantityKwh",
                           template="plotly_white")
 
-        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+        show_chart(fig)
\ No newline at end of file
@@ -0,0 +1,171 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+### DECIMATED PLOTTING ###
+
+# Points per trace sent to the browser, about two per pixel of a full-width chart
+PLOT_POINTS = 2000
+
+DECIMATION_METHODS = ["minmax", "lttb"]
+
+
+def _as_float(x):
+    """Numeric view of x values for distance computations (datetimes as ns)."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def minmax_indices(y, n_out):
+    """Indices of the min and max of each of n_out / 2 equal buckets, which keeps every spike."""
+    y = np.asarray(y, dtype=np.float64)
+    buckets = max(1, n_out // 2)
+    size = -(-len(y) // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:len(y)] = y
+    padded = padded.reshape(buckets, size)
+
+    # NaN never wins, empty tail buckets point at their first (padded) slot and are dropped below
+    offsets = np.arange(buckets) * size
+    lo = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1) + offsets
+    hi = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1) + offsets
+    idx = np.unique(np.concatenate([[0, len(y) - 1], lo, hi]))
+    return idx[idx < len(y)]
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets selection of n_out points, which keeps the visual shape."""
+    x, y = _as_float(x), np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def decimate(x, y, n_out=PLOT_POINTS, method="minmax"):
+    """Return the indices of at most about n_out points of (x, y) to plot."""
+    if len(y) <= n_out:
+        return np.arange(len(y))
+    if method == "minmax":
+        return minmax_indices(y, n_out)
+    if method == "lttb":
+        return lttb_indices(x, y, n_out)
+    raise ValueError(f"Unknown decimation method '{method}', use one of {DECIMATION_METHODS}")
+
+
+def in_window(x, window):
+    """Boolean mask of the x values inside a (start, end) window, all True without one."""
+    x = np.asarray(x)
+    if window is None:
+        return np.ones(len(x), dtype=bool)
+    lo, hi = window
+    if np.issubdtype(x.dtype, np.datetime64):
+        lo, hi = np.datetime64(pd.Timestamp(lo)), np.datetime64(pd.Timestamp(hi))
+    return (x >= lo) & (x <= hi)
+
+
+def scatter(x, y, window=None, n_out=PLOT_POINTS, method="minmax", **kwargs):
+    """go.Scatter of the points of (x, y) inside `window`, decimated to n_out points."""
+    x, y = np.asarray(x), np.asarray(y)
+    if window is not None:
+        mask = in_window(x, window)
+        x, y = x[mask], y[mask]
+    idx = decimate(x, y, n_out, method)
+    return go.Scatter(x=x[idx], y=y[idx], meta={"points_available": len(y)}, **kwargs)
+
+
+def line(df, x, y, color=None, window=None, n_out=PLOT_POINTS, method="minmax", **kwargs):
+    """px.line of the rows of df inside `window`, decimated to n_out points per color group."""
+    df = df[in_window(df[x].to_numpy(), window)]
+    groups = df.groupby(color, sort=False) if color is not None else [(None, df)]
+
+    pieces, available = [], {}
+    for name, group in groups:
+        name = name[0] if isinstance(name, tuple) else name
+        idx = decimate(group[x].to_numpy(), group[y].to_numpy(), n_out, method)
+        pieces.append(group.iloc[idx])
+        available[name] = len(group)
+
+    fig = px.line(pd.concat(pieces) if pieces else df, x=x, y=y, color=color, **kwargs)
+    fig.for_each_trace(lambda trace: trace.update(
+        meta={"points_available": available.get(trace.name if color is not None else None, len(trace.x))}))
+    return fig
+
+
+def lines(x, columns, window=None, n_out=PLOT_POINTS, method="minmax", **layout):
+    """go.Figure with one decimated line per {name: values} of a wide table sharing the x values."""
+    fig = go.Figure([scatter(x, y, window, n_out, method, mode="lines", name=name)
+                     for name, y in columns.items()])
+    fig.update_layout(**layout)
+    return fig
+
+
+def _zoom_key(key):
+    return f"{key}__zoom"
+
+
+def zoom_window(key):
+    """The x range box-selected on the chart shown with `key`, None for the full range."""
+    return st.session_state.get(_zoom_key(key))
+
+
+def _store_zoom(key):
+    boxes = st.session_state[key].selection.get("box") or []
+    if boxes:
+        st.session_state[_zoom_key(key)] = tuple(sorted(boxes[0]["x"]))
+
+
+def _clear_zoom(key):
+    st.session_state.pop(_zoom_key(key), None)
+
+
+def _trace_points(trace):
+    z = getattr(trace, "z", None)
+    return np.asarray(z).size if z is not None else len(trace.x)
+
+
+def show_chart(fig, key=None):
+    """st.plotly_chart that reports the points sent, with box-select zoom when given a key.
+
+    Box-selecting an x range reruns the page, and the traces built with
+    scatter/line(window=zoom_window(key)) are re-cut at full resolution for that range.
+    Charts that only exist right after a button press should not pass a key.
+    """
+    if key is None:
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        fig.update_layout(dragmode="select", selectdirection="h")
+        st.plotly_chart(fig, use_container_width=True, key=key, on_select=lambda: _store_zoom(key),
+                        selection_mode="box")
+
+    # Points of line traces, cells of heatmaps
+    traces = [trace for trace in fig.data if getattr(trace, "x", None) is not None]
+    sent = sum(_trace_points(trace) for trace in traces)
+    available = sum((trace.meta or {}).get("points_available", _trace_points(trace)) for trace in traces)
+    window = zoom_window(key) if key is not None else None
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        text = f"Showing {sent:,} of {available:,} points."
+        if key is not None and window is None:
+            text += " Box-select a time range to zoom in at full resolution."
+        elif window is not None:
+            text += f" Zoomed to {window[0]} - {window[1]}."
+        st.caption(text)
+    with col2:
+        if window is not None:
+            st.button("Full range", key=f"{key}__reset", on_click=_clear_zoom, args=(key,))
@@ -0,0 +1,112 @@
+"""Benchmark the server time of one click on the maps page, before and after the map state layer.
+
+"rebuild" is the old page: a fresh folium.Map with the full-resolution outline,
+choropleth and tooltip layers plus every marker, rendered twice per click because
+the click handler called st.rerun(). "overlay" is the current page: a plain
+base map plus one feature group with the simplified areas and the markers, rendered
+once. Each click runs as a Streamlit script (streamlit.testing AppTest), so only the
+Python side is timed, and the payload is the st_folium component message sent to the
+browser.
+
+Run from multipage_app/:
+
+    python scripts/bench_map_click.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo_utils import load_price_areas, simplify_areas
+
+REPEATS = 5
+N_POINTS = 20
+
+
+def sample_state():
+    rng = np.random.default_rng(0)
+    points = [{"lat": lat, "lon": lon, "area": "NO 1"}
+              for lat, lon in zip(rng.uniform(58, 70, N_POINTS), rng.uniform(5, 30, N_POINTS))]
+    mean_values = pd.DataFrame({"priceArea": ["NO1", "NO2", "NO3", "NO4", "NO5"],
+                                "quantityKwh": [120.0, 340.0, 80.0, 150.0, 260.0]})
+    return points, mean_values
+
+
+# Page functions run as scripts by AppTest, so they import what they use themselves
+def rebuild_page(gdf, points, mean_values):
+    import folium
+    import numpy as np
+    from streamlit_folium import st_folium
+
+    m = folium.Map(location=[65, 15], zoom_start=4)
+    folium.GeoJson(gdf, name="Price Area Outlines",
+                   style_function=lambda feature: {'fillColor': 'transparent', 'color': 'blue',
+                                                   'weight': 3, 'fillOpacity': 0.0},
+                   tooltip=folium.GeoJsonTooltip(fields=["ElSpotOmr"], aliases=["Price Area"])).add_to(m)
+    for point in points:
+        folium.Marker(location=[point["lat"], point["lon"]], popup=point["area"]).add_to(m)
+
+    merged = gdf.copy()
+    merged["join_key"] = merged["ElSpotOmr"].str.replace(" ", "")
+    merged = merged.merge(mean_values, left_on="join_key", right_on="priceArea", how="left")
+    bins = list(np.linspace(mean_values["quantityKwh"].min(), mean_values["quantityKwh"].max(), 6))
+    folium.Choropleth(geo_data=merged, data=mean_values, columns=["priceArea", "quantityKwh"],
+                      key_on="feature.properties.join_key", fill_color="YlOrRd", bins=bins).add_to(m)
+    folium.GeoJson(merged, tooltip=folium.GeoJsonTooltip(fields=["ElSpotOmr", "quantityKwh"])).add_to(m)
+    st_folium(m, width=700, height=500)
+
+
+def overlay_page(areas, points, mean_values):
+    import folium
+    import numpy as np
+    from streamlit_folium import st_folium
+    from geo_utils import area_layer
+
+    bins = list(np.linspace(mean_values["quantityKwh"].min(), mean_values["quantityKwh"].max(), 6))
+    overlay = folium.FeatureGroup(name="Price Areas")
+    layer, _ = area_layer(areas, dict(zip(mean_values["priceArea"], mean_values["quantityKwh"])), bins,
+                          selected="NO 1")
+    layer.add_to(overlay)
+    for point in points:
+        folium.Marker(location=[point["lat"], point["lon"]], popup=point["area"]).add_to(overlay)
+    base = folium.Map(location=[65, 15], zoom_start=4)
+    st_folium(base, width=700, height=500, feature_group_to_add=overlay)
+
+
+def run_page(page, *args):
+    """Run a page function once and return the bytes of its st_folium component messages."""
+    at = AppTest.from_function(page, args=args, default_timeout=300).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return sum(len(element.proto.json_args) for element in at.get("component_instance"))
+
+
+def best_time(fn):
+    times = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        payload = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), payload
+
+
+def main():
+    gdf = load_price_areas()
+    areas = simplify_areas(gdf, 4)
+    points, mean_values = sample_state()
+
+    rebuild, rebuild_bytes = best_time(lambda: run_page(rebuild_page, gdf, points, mean_values))
+    overlay, overlay_bytes = best_time(lambda: run_page(overlay_page, areas, points, mean_values))
+
+    print(f"{'page':<10} {'renders':>8} {'ms/click':>9} {'payload kB':>11}")
+    print(f"{'rebuild':<10} {2:>8} {2 * rebuild * 1000:>9.0f} {rebuild_bytes / 1000:>11.0f}")
+    print(f"{'overlay':<10} {1:>8} {overlay * 1000:>9.0f} {overlay_bytes / 1000:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark the old list-of-dicts loader against the columnar Arrow loaders.
+
+Compares wall time and peak RSS of `pd.DataFrame(list(collection.find()))` and
+`utils.load_columns`, with pymongoarrow (the shipped decoder) and with its pure
+pyarrow fallback, for one year and four years of production data. Every case runs
+in a fresh process so peak RSS is not shared between cases.
+
+With --offline no server is used: each case replays BSON reply batches recorded from
+synthetic production documents (every price area and group, hourly) through the same
+pymongo decoding calls, so only the client-side decoding is timed.
+
+Run from multipage_app/ so Streamlit finds .streamlit/secrets.toml:
+
+    python scripts/bench_mongo_loaders.py [--offline]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import resource
+import types
+import multiprocessing as mp
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RANGES = {
+    "1 year": (datetime(2024, 1, 1), datetime(2025, 1, 1)),
+    "4 years": (datetime(2021, 1, 1), datetime(2025, 1, 1)),
+}
+LOADERS = ["list_of_dicts", "columnar", "pymongoarrow"]
+
+AREAS = ["NO1", "NO2", "NO3", "NO4", "NO5"]
+GROUPS = ["hydro", "wind", "solar", "thermal", "other"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RecordedCollection:
+    """Serves recorded BSON reply batches through find / find_raw_batches, as a pymongo Collection would."""
+
+    def __init__(self, batches):
+        import bson
+        self.batches = batches
+        self.codec_options = bson.DEFAULT_CODEC_OPTIONS
+        self.database = types.SimpleNamespace(client=types.SimpleNamespace(append_metadata=None))
+
+    def find_raw_batches(self, query, **kwargs):
+        return iter(self.batches)
+
+    def find(self, query, projection=None, **kwargs):
+        import bson
+        return (doc for batch in self.batches for doc in bson.decode_all(batch, self.codec_options))
+
+
+def recorded_collection(start, end, with_id, batch_size):
+    """RecordedCollection of hourly production documents in [start, end), with the _id when unprojected."""
+    import bson
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    docs, batches = [], []
+    hour = start
+    while hour < end:
+        for area in AREAS:
+            for group in GROUPS:
+                doc = {"_id": bson.ObjectId()} if with_id else {}
+                doc.update(priceArea=area, productionGroup=group, startTime=hour,
+                           quantityKwh=float(rng.integers(0, 10**6)))
+                docs.append(bson.encode(doc))
+                if len(docs) == batch_size:
+                    batches.append(b"".join(docs))
+                    docs = []
+        hour += timedelta(hours=1)
+    if docs:
+        batches.append(b"".join(docs))
+    return RecordedCollection(batches)
+
+
+def run_case(loader, start, end, offline, queue):
+    import pandas as pd
+    if offline:
+        # utils reads the Mongo URI at import, the client never connects here
+        secrets = os.path.join(tempfile.mkdtemp(), "secrets.toml")
+        with open(secrets, "w") as f:
+            f.write('[mongo]\nuri = "mongodb://localhost:27017"\n')
+        from streamlit import config
+        config.set_option("secrets.files", [secrets])
+    import utils
+
+    if offline:
+        collection = recorded_collection(start, end, loader == "list_of_dicts", utils.BATCH_SIZE)
+    else:
+        collection = utils.client['ind320_production_db']['ind320_production_table_d4']
+    query = {"startTime": {"$gte": start, "$lt": end}}
+    if loader == "columnar":
+        utils._find_arrow_all = None
+    elif loader == "pymongoarrow" and utils._find_arrow_all is None:
+        queue.put(None)
+        return
+
+    rss_before = peak_rss_mb()
+    t0 = time.perf_counter()
+    if loader == "list_of_dicts":
+        df = pd.DataFrame(list(collection.find(query)))
+    else:
+        table = utils.load_columns(collection, query, utils.ELHUB_SCHEMAS["production"])
+        df = table.to_pandas(coerce_temporal_nanoseconds=True)
+    elapsed = time.perf_counter() - t0
+    queue.put((len(df), elapsed, peak_rss_mb() - rss_before, df.memory_usage(deep=True).sum() / 2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--offline", action="store_true", help="replay recorded batches instead of querying Atlas")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'range':<8} {'loader':<14} {'rows':>9} {'wall s':>8} {'peak RSS +MB':>13} {'frame MB':>9}")
+    for label, (start, end) in RANGES.items():
+        for loader in LOADERS:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=run_case, args=(loader, start, end, args.offline, queue))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                raise RuntimeError(f"{label} {loader} case failed with exit code {proc.exitcode}")
+            result = queue.get()
+            if result is None:
+                print(f"{label:<8} {loader:<14} (pymongoarrow is not installed)")
+                continue
+            rows, elapsed, rss, frame_mb = result
+            print(f"{label:<8} {loader:<14} {rows:>9} {elapsed:>8.2f} {rss:>13.1f} {frame_mb:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
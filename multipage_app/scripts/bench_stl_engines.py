@@ -0,0 +1,81 @@
+"""Benchmark and compare the exact and fast STL engines across seasonal periods.
+
+For every period the STL tab allows (168-2160 hours) both engines fit one year of
+hourly production with the tab's smoothers (period + 3). Reports wall time, the RMS
+difference of each component as % of the series standard deviation, the 3-sigma
+residual outlier counts of both fits, and the time per (point x LOESS window) that
+stl_utils.STL_SECONDS_PER_POINT_WINDOW is calibrated from.
+
+Run from multipage_app/ so Streamlit finds .streamlit/secrets.toml:
+
+    python scripts/bench_stl_engines.py [--robust] [--synthetic]
+
+--synthetic uses a generated year (daily, weekly and yearly cycles, noise and spikes)
+instead of NO1 hydro 2021, so it runs without a database.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stl_utils import STL_COMPONENTS, _low_pass_window, choose_stl_engine, fit_stl, stl_passes
+
+PERIODS = [168, 336, 720, 1440, 2160]
+
+
+def synthetic_year(n=8760, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    values = (1000 + 300 * np.sin(2 * np.pi * t / n) + 120 * np.sin(2 * np.pi * t / 24)
+              + 60 * np.sin(2 * np.pi * t / 168) + rng.normal(0, 40, n))
+    values[rng.integers(0, n, 40)] += 600
+    return values
+
+
+def outliers(resid):
+    threshold = 3 * np.std(resid)
+    return int(((resid > threshold) | (resid < -threshold)).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--robust", action="store_true")
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        values = synthetic_year()
+    else:
+        import utils
+        values = utils.get_production_data(2021, columns=["quantityKwh"],
+                                           filters={"priceArea": "NO1", "productionGroup": "hydro"})["quantityKwh"].to_numpy()
+    scale = np.std(values)
+    passes = stl_passes(args.robust)
+
+    print(f"{len(values)} points, robust={args.robust}")
+    print(f"{'period':>6} {'exact s':>8} {'fast s':>7} {'speedup':>8} "
+          + " ".join(f"{name + ' %':>10}" for name in STL_COMPONENTS)
+          + f" {'outliers':>10} {'s/pt-win':>9} {'engine':>6}")
+    for period in PERIODS:
+        smoother = period + 3
+        t0 = time.perf_counter()
+        exact = fit_stl(values, period, smoother, smoother, args.robust, "exact")
+        exact_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        fast = fit_stl(values, period, smoother, smoother, args.robust, "fast")
+        fast_s = time.perf_counter() - t0
+
+        diffs = [100 * np.sqrt(np.mean((exact[name] - fast[name]) ** 2)) / scale for name in STL_COMPONENTS]
+        per_point_window = exact_s / (len(values) * (2 * smoother + _low_pass_window(period)) * passes)
+        engine = choose_stl_engine(len(values), period, smoother, smoother, args.robust)
+        print(f"{period:>6} {exact_s:>8.2f} {fast_s:>7.3f} {exact_s / fast_s:>7.0f}x "
+              + " ".join(f"{diff:>10.3f}" for diff in diffs)
+              + f" {outliers(exact['resid']):>4}/{outliers(fast['resid']):<5} {per_point_window:>9.2e} {engine:>6}")
+
+
+if __name__ == "__main__":
+    main()
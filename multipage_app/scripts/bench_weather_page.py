@@ -0,0 +1,88 @@
+"""Benchmark one rerun of the weather page's single-variable chart, melted vs columnar.
+
+"melt" is the page's former path: month-name column, wide-to-long melt, month-name
+isin filter, variable filter and plot_utils.line. "columnar" is the current one: a
+binary-searched month row slice of the wide float32 frame and plot_utils.lines.
+Reports the median wall time and the peak traced allocation per rerun.
+
+Runs on a synthetic year shaped like WeatherStore.frame output, so it needs no network:
+
+    python scripts/bench_weather_page.py
+"""
+import calendar
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plot_utils import line, lines
+from weather_utils import WEATHER_VARIABLES, month_rows
+
+REPEATS = 20
+MONTH_RANGES = [("January", "January"), ("March", "August"), ("January", "December")]
+VARIABLE = "temperature_2m"
+
+
+def weather_year(year=2021, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+    df = pd.DataFrame(rng.normal(size=(len(times), len(WEATHER_VARIABLES))).astype(np.float32),
+                      columns=WEATHER_VARIABLES)
+    df.insert(0, "date", times)
+    return df
+
+
+def melt_path(df, month_range):
+    df = df.copy()  # the page added its columns to the frame it fetched
+    months = list(calendar.month_name)[1:]
+    selected_months = months[months.index(month_range[0]):months.index(month_range[1]) + 1]
+    df['time'] = df['date']
+    df['month'] = df['time'].dt.month_name()
+    columns = [column for column in df.columns if column not in ['time', 'month', 'date']]
+    df_melted = df.melt(id_vars=['time', 'month'], value_vars=columns, var_name='variable', value_name='value')
+    df_selected = df_melted[df_melted['month'].isin(selected_months)]
+    df_col = df_selected[df_selected['variable'] == VARIABLE]
+    return line(df_col, x="time", y="value", color="variable")
+
+
+def columnar_path(df, month_range):
+    months = list(calendar.month_name)[1:]
+    rows = month_rows(df['date'].to_numpy(), months.index(month_range[0]) + 1, months.index(month_range[1]) + 1)
+    times = df['date'].to_numpy()[rows]
+    return lines(times, {VARIABLE: df[VARIABLE].to_numpy()[rows]})
+
+
+def measure(path, df, month_range):
+    path(df, month_range)  # warm-up
+    times = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        path(df, month_range)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    path(df, month_range)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return np.median(times), peak
+
+
+def main():
+    df = weather_year()
+    print(f"{len(df)} hours x {len(WEATHER_VARIABLES)} variables, {VARIABLE} chart, median of {REPEATS}")
+    print(f"{'months':<20} {'melt ms':>8} {'columnar ms':>12} {'speedup':>8} "
+          f"{'melt peak MB':>13} {'columnar peak MB':>17} {'ratio':>6}")
+    for month_range in MONTH_RANGES:
+        melt_s, melt_peak = measure(melt_path, df, month_range)
+        columnar_s, columnar_peak = measure(columnar_path, df, month_range)
+        print(f"{' - '.join(month_range):<20} {1000 * melt_s:>8.1f} {1000 * columnar_s:>12.1f} "
+              f"{melt_s / columnar_s:>7.1f}x {melt_peak / 2**20:>13.2f} {columnar_peak / 2**20:>17.2f} "
+              f"{melt_peak / columnar_peak:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
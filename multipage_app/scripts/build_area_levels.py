@@ -0,0 +1,23 @@
+"""Prebuild the simplified price area geometries the maps page renders at each zoom level.
+
+Writes one GeoJSON per geo_utils.AREA_ZOOM_LEVELS into geo_utils.AREA_LEVELS_DIR. The
+page simplifies on first use when the files are missing, so this only saves that step.
+Run from multipage_app/:
+
+    python scripts/build_area_levels.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo_utils import build_area_levels, load_price_areas
+
+
+def main():
+    for path in build_area_levels(load_price_areas()):
+        print(f"{path}: {os.path.getsize(path) / 1e3:.0f} kB")
+
+
+if __name__ == "__main__":
+    main()
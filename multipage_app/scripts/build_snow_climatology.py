@@ -0,0 +1,126 @@
+"""Precompute the snow drift climatology of every ERA5 grid cell in the price areas.
+
+For every 0.25 degree ERA5 grid point inside pages/maps_area.geojson the job
+fetches the snow years FIRST_SEASON..LAST_SEASON, reduces them with
+snow_utils.snow_season_sums (yearly, monthly and 16-sector sums) and writes one
+part file per batch of cells. Batches run in parallel worker processes, and a
+restarted job skips every cell that already has a part file. When all cells are
+done the parts are merged into snow_utils.CLIMATOLOGY_FILE.
+
+Each batch is fetched as multi-location Open-Meteo requests, lower --batch-size
+or --workers if the API rate limit is hit.
+
+    python scripts/build_snow_climatology.py [--workers 4] [--batch-size 20]
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from weather_utils import ERA5_GRID_DEG, WEATHER_VARIABLES, date_chunks, fetch_weather
+from snow_utils import CLIMATOLOGY_DIR, CLIMATOLOGY_FILE, SUM_KEYS, snow_season_sums
+
+FIRST_SEASON, LAST_SEASON = 2000, 2024
+GEOJSON = os.path.join(APP_DIR, "pages", "maps_area.geojson")
+PARTS_DIR = os.path.join(CLIMATOLOGY_DIR, "parts")
+
+
+def grid_cells():
+    """Return the ERA5 grid points inside the price areas as an (N, 2) array of (lat, lon)."""
+    areas = gpd.read_file(GEOJSON).to_crs(epsg=4326).geometry.union_all()
+    min_lon, min_lat, max_lon, max_lat = areas.bounds
+    lats = np.arange(np.floor(min_lat / ERA5_GRID_DEG), np.ceil(max_lat / ERA5_GRID_DEG) + 1) * ERA5_GRID_DEG
+    lons = np.arange(np.floor(min_lon / ERA5_GRID_DEG), np.ceil(max_lon / ERA5_GRID_DEG) + 1) * ERA5_GRID_DEG
+    lat, lon = (a.ravel() for a in np.meshgrid(lats, lons, indexing="ij"))
+    inside = shapely.contains_xy(areas, lon, lat)
+    return np.round(np.column_stack([lat[inside], lon[inside]]), 4)
+
+
+def process_batch(cells):
+    """Fetch all snow years of a batch of cells and return their stacked season sums."""
+    cells = [tuple(cell) for cell in cells]
+    pieces = [[] for _ in cells]
+    for lo, hi in date_chunks(date(FIRST_SEASON, 7, 1), date(LAST_SEASON + 1, 6, 30)):
+        for piece, frame in zip(pieces, fetch_weather(cells, lo, hi)):
+            piece.append(frame)
+
+    sums = []
+    for piece in pieces:
+        df = pd.concat(piece, ignore_index=True).rename(columns={"date": "time"})
+        sums.append(snow_season_sums(df[["time"] + WEATHER_VARIABLES]))
+
+    result = {key: np.stack([s[key] for s in sums]).astype(np.float32) for key in SUM_KEYS}
+    result["month_hours"] = result["month_hours"].astype(np.int16)
+    result["cells"] = np.array(cells, dtype=np.float32)
+    result["seasons"] = sums[0]["seasons"].astype(np.int16)
+    return result
+
+
+def write_part(result):
+    """Write one finished batch atomically, named after its first cell."""
+    lat, lon = result["cells"][0]
+    path = os.path.join(PARTS_DIR, f"part_{lat:.2f}_{lon:.2f}.npz")
+    np.savez(path + ".tmp.npz", **result)
+    os.replace(path + ".tmp.npz", path)
+
+
+def load_parts():
+    parts = []
+    for path in sorted(glob.glob(os.path.join(PARTS_DIR, "part_*.npz"))):
+        with np.load(path) as data:
+            parts.append({key: data[key] for key in data.files})
+    return parts
+
+
+def consolidate(parts):
+    """Merge the part files into one climatology file with a (lat, lon) grid index."""
+    cells = np.concatenate([p["cells"] for p in parts]).astype(np.float64)
+    order = np.lexsort((cells[:, 1], cells[:, 0]))
+    cells = cells[order]
+
+    lat0, lon0 = cells[:, 0].min(), cells[:, 1].min()
+    i = np.round((cells[:, 0] - lat0) / ERA5_GRID_DEG).astype(int)
+    j = np.round((cells[:, 1] - lon0) / ERA5_GRID_DEG).astype(int)
+    grid_index = np.full((i.max() + 1, j.max() + 1), -1, dtype=np.int32)
+    grid_index[i, j] = np.arange(len(cells))
+
+    arrays = {key: np.concatenate([p[key] for p in parts])[order] for key in SUM_KEYS}
+    np.savez_compressed(CLIMATOLOGY_FILE, seasons=parts[0]["seasons"], lat=cells[:, 0], lon=cells[:, 1],
+                        grid_index=grid_index, lat0=lat0, lon0=lon0, grid_deg=ERA5_GRID_DEG, **arrays)
+    return len(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+    os.makedirs(PARTS_DIR, exist_ok=True)
+
+    cells = grid_cells()
+    done = {tuple(cell) for part in load_parts() for cell in np.round(part["cells"].astype(np.float64), 4)}
+    todo = [cell for cell in cells if tuple(cell) not in done]
+    batches = [todo[k:k + args.batch_size] for k in range(0, len(todo), args.batch_size)]
+    print(f"{len(cells)} cells, {len(done)} already done, {len(batches)} batches to run")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(process_batch, batch) for batch in batches]
+        for n, future in enumerate(as_completed(futures), 1):
+            write_part(future.result())
+            print(f"batch {n}/{len(batches)} done")
+
+    print(f"{consolidate(load_parts())} cells written to {CLIMATOLOGY_FILE}")
+
+
+if __name__ == "__main__":
+    main()
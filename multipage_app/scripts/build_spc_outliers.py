@@ -0,0 +1,62 @@
+"""Build the nationwide temperature SPC outlier table for one (cutoff, n_std).
+
+Runs spc_utils.build_outlier_table over the DATA cities and WEATHER_CUBE_YEARS (one
+batched DCT per year length) and stores it where the outlier page reads it. Prints
+the build time next to the time of the same series done one at a time, as the page
+used to. Prebuild the weather with scripts/build_weather_cube.py first, or the
+missing years are fetched here.
+
+Run from multipage_app/:
+
+    python scripts/build_spc_outliers.py [--cutoff 168] [--n-std 3]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spc_utils import SPC_CACHE_DIR, build_outlier_table, outlier_table, spc_outliers, _table_file
+from weather_utils import DATA, WEATHER_CUBE_YEARS, WEATHER_VARIABLES, WeatherStore, weather_cell
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cutoff", type=int, default=168, help="DCT cutoff period in hours")
+    parser.add_argument("--n-std", type=float, default=3)
+    args = parser.parse_args()
+
+    first_year, last_year = WEATHER_CUBE_YEARS
+    cells = {city: weather_cell(info['Latitude'], info['Longitude']) for city, info in DATA.items()}
+    store = WeatherStore()
+    store.fill(list(cells.values()), date(first_year, 1, 1), date(last_year, 12, 31))
+
+    t0 = time.perf_counter()
+    table = build_outlier_table(store, cells, first_year, last_year, args.cutoff, args.n_std)
+    batched_s = time.perf_counter() - t0
+
+    # The same series one at a time
+    column = WEATHER_VARIABLES.index("temperature_2m")
+    t0 = time.perf_counter()
+    count = 0
+    for cell in cells.values():
+        for year in range(first_year, last_year + 1):
+            values = store.window(cell, date(year, 1, 1), date(year, 12, 31))[:, column]
+            count += int(spc_outliers(values, args.cutoff, args.n_std)["mask"].sum())
+    single_s = time.perf_counter() - t0
+
+    path = _table_file("temperature_2m", args.cutoff, args.n_std, first_year, last_year)
+    if os.path.exists(path):
+        os.remove(path)
+    outlier_table(store, cells, first_year, last_year, args.cutoff, args.n_std)
+
+    print(f"{len(cells)} cities x {last_year - first_year + 1} years, cutoff {args.cutoff} h, n_std {args.n_std:g}")
+    print(f"{len(table)} outlier hours (one at a time: {count}), batched {batched_s:.2f} s, "
+          f"one at a time {single_s:.2f} s")
+    print(f"stored in {SPC_CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
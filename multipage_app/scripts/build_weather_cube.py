@@ -0,0 +1,43 @@
+"""Prebuild the weather cube of the DATA cities for WEATHER_CUBE_YEARS.
+
+Fills the memory-mapped WeatherStore files of the five DATA cities' grid cells for
+every hour of the years, as multi-location Open-Meteo requests. Only days the store
+does not hold yet are fetched, so a rerun after an interruption resumes. Cells
+clicked on the map are still added lazily by the pages.
+
+Run from multipage_app/:
+
+    python scripts/build_weather_cube.py [--first-year 2000] [--last-year 2024]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weather_utils import DATA, WEATHER_CUBE_YEARS, WeatherStore, weather_cell
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--first-year", type=int, default=WEATHER_CUBE_YEARS[0])
+    parser.add_argument("--last-year", type=int, default=WEATHER_CUBE_YEARS[1])
+    args = parser.parse_args()
+
+    cells = [weather_cell(info['Latitude'], info['Longitude']) for info in DATA.values()]
+    store = WeatherStore()
+    t0 = time.perf_counter()
+    for lo, hi in store.iter_fill(cells, date(args.first_year, 1, 1), date(args.last_year, 12, 31)):
+        print(f"fetched {lo} - {hi} ({time.perf_counter() - t0:.0f} s)")
+
+    cube = store.cube(cells, date(args.first_year, 1, 1), date(args.last_year, 12, 31))
+    print(f"cube {cube.shape} (cell, hour, variable) float32 in {store.path}, "
+          f"{cube.nbytes / 2**20:.0f} MB, {int(np.isnan(cube[..., 0]).sum())} missing hours")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Print MongoDB explain() statistics for the queries the pages issue.
+
+For every query the table shows the index used, keys and documents examined
+versus documents returned, and whether the query is covered by an index
+(no documents fetched at all).
+
+Run from multipage_app/ so Streamlit finds .streamlit/secrets.toml:
+
+    python scripts/explain_queries.py
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+# (label, dataset, columns, filters) of representative page queries
+QUERIES = [
+    ("production year 2022", "production", None, utils._time_filters(2022)),
+    ("STL series NO1/hydro 2022", "production", None,
+     utils._time_filters(2022) + utils._value_filters({"priceArea": "NO1", "productionGroup": "hydro"})),
+    ("SARIMAX exog NO2 production", "production", ["priceArea", "startTime", "quantityKwh"],
+     utils._value_filters({"priceArea": "NO2"})),
+    ("maps consumption Jan-Mar 2023", "consumption", ["priceArea", "consumptionGroup", "startTime", "quantityKwh"],
+     utils._time_filters(start_date=datetime(2023, 1, 1), end_date=datetime(2023, 4, 1))),
+    ("correlation consumption 2021", "consumption", ["startTime", "quantityKwh"], utils._time_filters(2021)),
+]
+
+
+def main():
+    print(f"indexes: {', '.join(utils.ensure_indexes())}")
+    print(f"{'query':<32} {'index':<50} {'keys':>8} {'docs':>8} {'returned':>9} {'covered':>8} {'ms':>6}")
+    for label, dataset, columns, filters in QUERIES:
+        stats = utils.explain_query(dataset, columns, filters)
+        print(f"{label:<32} {','.join(stats['indexes']) or 'COLLSCAN':<50} {stats['keys_examined']:>8} "
+              f"{stats['docs_examined']:>8} {stats['returned']:>9} {str(stats['covered']):>8} {stats['millis']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Warm the STL cache for every production series with the STL tab's default parameters and engine.
+
+Fits all (priceArea, productionGroup) series of each year over a process pool and
+stores the components in stl_utils.STL_CACHE_DIR, so the first visit of the STL tab
+is a cache hit. Series already in the cache are skipped.
+
+Run from multipage_app/ so Streamlit finds .streamlit/secrets.toml:
+
+    python scripts/precompute_stl.py [year ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from stl_utils import DEFAULT_STL_PARAMS, STL_CACHE_DIR, batch_decompose, choose_stl_engine
+
+YEARS = [2021, 2022, 2023, 2024]
+
+
+def main():
+    years = [int(year) for year in sys.argv[1:]] or YEARS
+    for year in years:
+        t0 = time.perf_counter()
+        series_values = utils.get_year_series("production", year)
+
+        # Fit each series with the engine the page picks for its length
+        by_engine = {}
+        for series, values in series_values.items():
+            engine = choose_stl_engine(len(values), **DEFAULT_STL_PARAMS)
+            by_engine.setdefault(engine, {})[series] = values
+        for engine, group in by_engine.items():
+            batch_decompose(group, **DEFAULT_STL_PARAMS, engine=engine)
+        print(f"{year}: {len(series_values)} series in {time.perf_counter() - t0:.1f} s -> {STL_CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Sync the local Parquet mirror of the Elhub collections and refresh their rollups.
+
+The app syncs on demand, running this once after deployment (or from cron)
+makes the first page load read from local disk instead of Atlas.
+
+Run from multipage_app/ so Streamlit finds .streamlit/secrets.toml:
+
+    python scripts/sync_elhub_mirror.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+
+def main():
+    for dataset in utils.ELHUB_DATASETS:
+        t0 = time.perf_counter()
+        rows = utils.sync_mirror(dataset)
+        print(f"{dataset}: {rows} rows synced in {time.perf_counter() - t0:.1f} s -> {utils.MIRROR_DIR}")
+        t0 = time.perf_counter()
+        utils.refresh_rollups(dataset)
+        print(f"{dataset}: rollups refreshed in {time.perf_counter() - t0:.1f} s -> {utils.ROLLUP_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import numpy as np
+import pandas as pd
+
+### SNOW DRIFT (TABLER) TRANSPORT MODEL ###
+
+# Code source: Provided by Sir (IND-320), vectorized with NumPy
+
+# Wind-rose sectors (16 x 22.5 degrees, sector 0 centred on north)
+NUM_SECTORS = 16
+
+
+def wind_transport(hourly_wind_speeds, dt=3600):
+    """Return the potential transport u^3.8 * dt / 233847 of every hour (kg/m)."""
+    u = np.asarray(hourly_wind_speeds, dtype=np.float64)
+    return u ** 3.8 * dt / 233847
+
+
+def compute_Qupot(hourly_wind_speeds, dt=3600):
+    return np.nansum(wind_transport(hourly_wind_speeds, dt))
+
+
+def sector_index(direction):
+    return (((np.asarray(direction, dtype=np.float64) + 11.25) % 360) // 22.5).astype(np.int64) % NUM_SECTORS
+
+
+def compute_sector_transport(hourly_wind_speeds, hourly_wind_dirs, dt=3600):
+    direction = np.asarray(hourly_wind_dirs, dtype=np.float64)
+    known = ~np.isnan(direction)
+    transport = np.where(known, np.nan_to_num(wind_transport(hourly_wind_speeds, dt)), 0.0)
+    return np.bincount(sector_index(np.where(known, direction, 0.0)), weights=transport, minlength=NUM_SECTORS)
+
+
+def snow_transport_from_sums(T, F, theta, Swe, Qupot):
+    """Tabler transport from per-period sums of snowfall (Swe) and wind transport (Qupot).
+
+    All arguments broadcast, so whole arrays of periods or parameters are evaluated at once.
+    """
+    Swe, Qupot = np.asarray(Swe, dtype=np.float64), np.asarray(Qupot, dtype=np.float64)
+    Qspot = 0.5 * T * Swe
+    Srwe = theta * Swe
+    snowfall_controlled = Qupot > Qspot
+    Qinf = np.where(snowfall_controlled, 0.5 * T * Srwe, Qupot)
+    Qt = Qinf * (1 - 0.14 ** (F / T))
+    return {"Qupot (kg/m)": Qupot, "Qspot (kg/m)": Qspot, "Srwe (mm)": Srwe,
+            "Qinf (kg/m)": Qinf, "Qt (kg/m)": Qt,
+            "Control": np.where(snowfall_controlled, "Snowfall controlled", "Wind controlled")}
+
+
+def compute_snow_transport(T, F, theta, Swe, hourly_wind_speeds, dt=3600):
+    result = snow_transport_from_sums(T, F, theta, Swe, compute_Qupot(hourly_wind_speeds, dt))
+    return {key: value.item() for key, value in result.items()}
+
+
+def snow_transport_sweep(sums, T_values, F_values, theta_values):
+    """Mean yearly Qt (kg/m) for every combination of T, F and theta.
+
+    Evaluated from the season sums of snow_season_sums in one broadcast, the result has
+    shape (len(T_values), len(F_values), len(theta_values)).
+    """
+    T = np.asarray(T_values, dtype=np.float64)[:, None, None, None]
+    F = np.asarray(F_values, dtype=np.float64)[None, :, None, None]
+    theta = np.asarray(theta_values, dtype=np.float64)[None, None, :, None]
+    Swe, Qupot = sums["swe"], sums["qupot"]
+
+    # Same as snow_transport_from_sums, without the per-period columns the sweep drops
+    Qinf = np.where(Qupot > 0.5 * T * Swe, 0.5 * T * theta * Swe, Qupot)
+    Qt = Qinf * (1 - 0.14 ** (F / T))
+    return Qt.mean(axis=-1)
+
+
+def snow_season_sums(df, dt=3600):
+    """Per-season, per-month and per-sector sums of snowfall and wind transport in one pass.
+
+    Snow seasons run July-June and are labelled by the year they start in. Returns a dict
+    with the season labels, and (season,) Swe/Qupot, (season, 12) monthly Swe/Qupot/hour
+    counts indexed by calendar month - 1, and (season, 16) sector Qupot arrays.
+
+    Hours with missing weather add nothing to the sums, as in a pandas .sum().
+    """
+    time = pd.DatetimeIndex(df["time"])
+    month = time.month.to_numpy()
+    season = time.year.to_numpy() - (month <= 6)
+
+    seasons, season_code = np.unique(season, return_inverse=True)
+    n = len(seasons)
+
+    temp = df["temperature_2m"].to_numpy(dtype=np.float64)
+    precip = df["precipitation"].to_numpy(dtype=np.float64)
+    swe = np.where(temp < 1, np.nan_to_num(precip), 0.0)
+    qu = np.nan_to_num(wind_transport(df["wind_speed_10m"].to_numpy(), dt))
+    direction = df["wind_direction_10m"].to_numpy(dtype=np.float64)
+    known = ~np.isnan(direction)
+    sector = sector_index(np.where(known, direction, 0.0))
+
+    month_code = season_code * 12 + (month - 1)
+    sector_code = season_code * NUM_SECTORS + sector
+    return {
+        "seasons": seasons,
+        "swe": np.bincount(season_code, weights=swe, minlength=n),
+        "qupot": np.bincount(season_code, weights=qu, minlength=n),
+        "month_swe": np.bincount(month_code, weights=swe, minlength=n * 12).reshape(n, 12),
+        "month_qupot": np.bincount(month_code, weights=qu, minlength=n * 12).reshape(n, 12),
+        "month_hours": np.bincount(month_code, minlength=n * 12).reshape(n, 12),
+        "sector_qupot": np.bincount(sector_code, weights=np.where(known, qu, 0.0), minlength=n * NUM_SECTORS).reshape(n, NUM_SECTORS),
+    }
+
+
+def snow_drift_results(df, T, F, theta, dt=3600):
+    """Yearly results, monthly results and average sector transport of hourly weather.
+
+    df needs 'time', 'temperature_2m', 'precipitation', 'wind_speed_10m' and
+    'wind_direction_10m'. Everything is reduced from one pass over the hours.
+    """
+    return results_from_sums(snow_season_sums(df, dt), T, F, theta)
+
+
+def results_from_sums(sums, T, F, theta):
+    """Yearly results, monthly results and average sector transport from snow_season_sums output."""
+    seasons = sums["seasons"]
+
+    yearly_results = pd.DataFrame(snow_transport_from_sums(T, F, theta, sums["swe"], sums["qupot"]))
+    yearly_results["snow_year"] = [f"July {y} – June {y+1}" for y in seasons]
+
+    # Months in (season, calendar month) order, as the rows of a groupby on both
+    season_idx, month_idx = np.nonzero(sums["month_hours"])
+    monthly_results = pd.DataFrame(snow_transport_from_sums(
+        T, F, theta, sums["month_swe"][season_idx, month_idx], sums["month_qupot"][season_idx, month_idx]))
+    month_names = pd.to_datetime(month_idx + 1, format="%m").strftime("%B")
+    monthly_results["Period"] = [f"{name} {seasons[s]}" for name, s in zip(month_names, season_idx)]
+    monthly_results["Qt (tonnes/m)"] = monthly_results["Qt (kg/m)"] / 1000
+    monthly_results["Type"] = "Monthly"
+
+    avg_sectors = sums["sector_qupot"].mean(axis=0)
+    return yearly_results, monthly_results, avg_sectors
+
+
+### PRECOMPUTED CLIMATOLOGY ###
+
+# Per-cell season sums for every ERA5 cell inside maps_area.geojson, written by
+# scripts/build_snow_climatology.py. Sums (not Qt) are stored so that any T, F and
+# theta can be evaluated from them.
+CLIMATOLOGY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snow_climatology")
+CLIMATOLOGY_FILE = os.path.join(CLIMATOLOGY_DIR, "climatology.npz")
+
+# Arrays of snow_season_sums stored per cell, with shape (cells, seasons, ...)
+SUM_KEYS = ["swe", "qupot", "month_swe", "month_qupot", "month_hours", "sector_qupot"]
+
+
+def load_climatology(path=CLIMATOLOGY_FILE):
+    """Load the precomputed climatology into a dict of arrays, or return None if it is not built."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def climatology_sums(clim, cell, first_season, last_season):
+    """Return snow_season_sums-style sums of a grid cell for seasons first..last, or None.
+
+    None means the cell is outside the precomputed area or the seasons are not covered.
+    """
+    grid_deg = float(clim["grid_deg"])
+    i = int(round((cell[0] - float(clim["lat0"])) / grid_deg))
+    j = int(round((cell[1] - float(clim["lon0"])) / grid_deg))
+    grid_index = clim["grid_index"]
+    if not (0 <= i < grid_index.shape[0] and 0 <= j < grid_index.shape[1]) or grid_index[i, j] < 0:
+        return None
+
+    seasons = clim["seasons"]
+    if first_season < seasons[0] or last_season > seasons[-1]:
+        return None
+    s = slice(first_season - seasons[0], last_season - seasons[0] + 1)
+
+    sums = {key: clim[key][grid_index[i, j], s].astype(np.float64) for key in SUM_KEYS}
+    sums["seasons"] = seasons[s]
+    return sums
@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import pandas as pd
+from datetime import date
+from scipy import fft as sp_fft
+
+from weather_utils import WEATHER_VARIABLES
+
+### BATCHED SPC (DCT + MAD) TEMPERATURE OUTLIERS ###
+
+# Robust standard deviation of normally distributed data from its MAD
+MAD_TO_STD = 1.4826
+
+# Outlier tables per (variable, cutoff, n_std, years), written by outlier_table
+SPC_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".spc_outliers")
+
+
+def spc_outliers(values, cutoff_hours, n_std, sampling_interval_hours=1.0):
+    """SPC outliers of many equal-length series at once, one series per row of `values`.
+
+    Each series is split by a DCT (type 2, orthonormal) into the components slower than
+    cutoff_hours (the baseline) and the rest (the seasonally adjusted temperature
+    variation, SATV). Hours whose SATV lies more than n_std robust standard deviations
+    (1.4826 x MAD) from the SATV median are outliers. Returns a dict of arrays: "mask",
+    "satv" and "baseline" of shape (series, hours), "median" and "robust_std" of shape (series,).
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n = values.shape[1]
+    k_cut = int((n * sampling_interval_hours) / cutoff_hours)
+
+    coefficients = sp_fft.dct(values, type=2, norm='ortho', axis=1, workers=-1)
+    low = coefficients.copy()
+    low[:, k_cut:] = 0
+    coefficients[:, :k_cut] = 0
+    satv = sp_fft.idct(coefficients, type=2, norm='ortho', axis=1, workers=-1)
+    baseline = sp_fft.idct(low, type=2, norm='ortho', axis=1, workers=-1)
+
+    median = np.median(satv, axis=1)
+    robust_std = MAD_TO_STD * np.median(np.abs(satv - median[:, None]), axis=1)
+    limit = (n_std * robust_std)[:, None]
+    mask = np.abs(satv - median[:, None]) > limit
+    return {"mask": mask, "satv": satv, "baseline": baseline, "median": median, "robust_std": robust_std}
+
+
+def _table_file(variable, cutoff_hours, n_std, first_year, last_year):
+    return os.path.join(SPC_CACHE_DIR,
+                        f"{variable}_c{int(cutoff_hours)}_n{n_std:g}_{first_year}-{last_year}.parquet")
+
+
+def build_outlier_table(store, cells, first_year, last_year, cutoff_hours, n_std, variable="temperature_2m"):
+    """Sparse table of the SPC outliers of every (city, year) series, one row per outlier hour.
+
+    cells maps a city name to its weather grid cell. Calendar years are the series, as
+    on the outlier page. Years of equal length (leap or not) are stacked into one
+    (city x year, hours) array and run through spc_outliers in a single batch.
+    """
+    store.fill(list(cells.values()), date(first_year, 1, 1), date(last_year, 12, 31))
+    column = WEATHER_VARIABLES.index(variable)
+
+    years = np.arange(first_year, last_year + 1)
+    leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+    tables = []
+    for group in (years[~leap], years[leap]):
+        if len(group) == 0:
+            continue
+        series = [(city, year) for city in cells for year in group]
+        values = np.stack([store.window(cells[city], date(year, 1, 1), date(year, 12, 31))[:, column]
+                           for city, year in series])
+        result = spc_outliers(values, cutoff_hours, n_std)
+
+        rows, hours = np.nonzero(result["mask"])
+        cities = np.array([city for city, _ in series])
+        series_years = np.array([year for _, year in series])
+        starts = series_years.astype(str).astype("datetime64[h]")
+        satv = result["satv"][rows, hours]
+        tables.append(pd.DataFrame({
+            "city": cities[rows],
+            "year": series_years[rows],
+            "time": (starts[rows] + hours.astype("timedelta64[h]")).astype("datetime64[ns]"),
+            variable: values[rows, hours].astype(np.float32),
+            "satv": satv.astype(np.float32),
+            # Distance from the SATV median in robust standard deviations
+            "score": ((satv - result["median"][rows]) / result["robust_std"][rows]).astype(np.float32),
+        }))
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    return table.sort_values(["city", "time"], ignore_index=True)
+
+
+def outlier_table(store, cells, first_year, last_year, cutoff_hours, n_std, variable="temperature_2m"):
+    """build_outlier_table, persisted as Parquet per (variable, cutoff, n_std, years) and read back later.
+
+    The persisted tables are those of the cells passed, the DATA cities on the outlier page.
+    """
+    path = _table_file(variable, cutoff_hours, n_std, first_year, last_year)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    table = build_outlier_table(store, cells, first_year, last_year, cutoff_hours, n_std, variable)
+    os.makedirs(SPC_CACHE_DIR, exist_ok=True)
+    table.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return table
@@ -0,0 +1,299 @@
+import streamlit as st
+import numpy as np
+import os
+import math
+import hashlib
+import threading
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft as sp_fft
+from scipy.signal import get_window
+from statsmodels.tsa.seasonal import STL
+
+### BATCHED STL DECOMPOSITION ###
+
+# Parameters the STL tab opens with, warmed by scripts/precompute_stl.py
+DEFAULT_STL_PARAMS = {"period": 720, "seasonal": 723, "trend": 723, "robust": False}
+
+# Decomposition engines. "exact" is statsmodels STL as is. "fast" is the same STL with
+# LOESS evaluated at every ceil(window / 10)-th point and linearly interpolated between
+# (the seasonal/trend/low_pass jumps of Cleveland et al.), so its cost no longer grows
+# with the period. On a year of hourly data (scripts/bench_stl_engines.py) it is 15-200x
+# faster for periods 168-2160. Component RMS differences stay below 0.5 % of the series
+# standard deviation (about 2 % for robust fits at period 2160) and the 3-sigma residual
+# outlier counts agree within 1.
+STL_ENGINES = ["exact", "fast"]
+
+# The page switches to the fast engine when one exact fit is estimated to take longer
+STL_LATENCY_BUDGET_S = 2.0
+
+# Seconds per (point x LOESS window) of one STL pass, calibrated with scripts/bench_stl_engines.py
+STL_SECONDS_PER_POINT_WINDOW = 4.6e-8
+
+STL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".stl_cache")
+STL_WORKERS = os.cpu_count() or 1
+STL_COMPONENTS = ["trend", "seasonal", "resid"]
+
+
+def stl_key(series, values, period, seasonal, trend, robust, engine="exact"):
+    """Cache key of one fit: the series id, the STL parameters and engine and a digest of the values.
+
+    series is a tuple such as ("production", 2021, "NO1", "hydro"). The digest makes a
+    fit of a year that has since gained hours a miss instead of a stale hit.
+    """
+    return (*series, int(period), int(seasonal), int(trend), bool(robust), engine, series_fingerprint(values))
+
+
+def series_fingerprint(values):
+    """Short digest of a series' values, identifying it in cache keys."""
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()[:16]
+
+
+def _low_pass_window(period):
+    # statsmodels' default low-pass window: the smallest odd integer > period
+    return period + 1 + period % 2
+
+
+def fit_stl(values, period, seasonal, trend, robust, engine="exact"):
+    """Fit one STL with an engine of STL_ENGINES and return its components as a dict of float64 arrays."""
+    jumps = {}
+    if engine == "fast":
+        jumps = {"seasonal_jump": math.ceil(seasonal / 10), "trend_jump": math.ceil(trend / 10),
+                 "low_pass_jump": math.ceil(_low_pass_window(period) / 10)}
+    elif engine != "exact":
+        raise ValueError(f"Unknown STL engine '{engine}', use one of {STL_ENGINES}")
+    res = STL(np.asarray(values, dtype=np.float64), period=period, seasonal=seasonal,
+              trend=trend, robust=robust, **jumps).fit()
+    return {"trend": res.trend, "seasonal": res.seasonal, "resid": res.resid}
+
+
+def stl_passes(robust):
+    """Smoothing passes of one statsmodels STL fit with its default iteration counts.
+
+    statsmodels uses inner_iter=5 without robustness, and inner_iter=2 with
+    outer_iter=15 (each outer pass repeats the inner loop, plus the initial one) with it.
+    """
+    inner_iter, outer_iter = (2, 15) if robust else (5, 0)
+    return inner_iter * (outer_iter + 1)
+
+
+def estimate_stl_seconds(n, period, seasonal, trend, robust):
+    """Estimated time of one exact STL fit of n points."""
+    passes = stl_passes(robust)
+    return STL_SECONDS_PER_POINT_WINDOW * n * (seasonal + trend + _low_pass_window(period)) * passes
+
+
+def choose_stl_engine(n, period, seasonal, trend, robust, budget=STL_LATENCY_BUDGET_S):
+    """Return "exact" when an exact fit stays within the latency budget, else "fast"."""
+    return "exact" if estimate_stl_seconds(n, period, seasonal, trend, robust) <= budget else "fast"
+
+
+class STLCache:
+    """Disk cache of STL components, one .npz file per stl_key."""
+
+    def __init__(self, path=STL_CACHE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, "_".join(str(part) for part in key) + ".npz")
+
+    def get(self, key):
+        path = self._file(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {name: data[name] for name in STL_COMPONENTS}
+
+    def put(self, key, result):
+        path = self._file(key)
+        np.savez(path + ".tmp.npz", **result)
+        os.replace(path + ".tmp.npz", path)
+
+
+def batch_decompose(series_values, period, seasonal, trend, robust, engine="exact", cache=None,
+                    workers=STL_WORKERS):
+    """Decompose many series with the same STL parameters, fitting only the cache misses.
+
+    series_values maps a series id tuple to its values. Misses are fitted in parallel
+    worker processes and stored in the cache. Returns {series id: components}.
+    """
+    cache = cache or STLCache()
+    keys = {series: stl_key(series, values, period, seasonal, trend, robust, engine)
+            for series, values in series_values.items()}
+    results = {series: cache.get(key) for series, key in keys.items()}
+    missing = [series for series, result in results.items() if result is None]
+
+    if len(missing) <= 1 or workers <= 1:
+        fitted = [fit_stl(series_values[series], period, seasonal, trend, robust, engine) for series in missing]
+    else:
+        # spawn, not fork: the Streamlit server process is multi-threaded
+        n = len(missing)
+        with ProcessPoolExecutor(max_workers=min(workers, n), mp_context=mp.get_context("spawn")) as pool:
+            fitted = list(pool.map(fit_stl, [series_values[series] for series in missing],
+                                   [period] * n, [seasonal] * n, [trend] * n, [robust] * n, [engine] * n))
+
+    for series, result in zip(missing, fitted):
+        cache.put(keys[series], result)
+        results[series] = result
+    return results
+
+
+### IN-MEMORY RESULT CACHE ###
+
+# Memory budget of the memoized STL and spectrogram results per server process
+RESULT_CACHE_BUDGET_BYTES = 256 * 2**20
+
+
+def _nbytes(value):
+    if isinstance(value, dict):
+        value = value.values()
+    return sum(np.asarray(part).nbytes for part in value)
+
+
+class ResultCache:
+    """Memory-bounded LRU of analysis results keyed by (kind, parameters..., series fingerprint).
+
+    Results are arrays or dicts/tuples of arrays, the least recently used are evicted
+    once their total size exceeds the budget.
+    """
+
+    def __init__(self, budget_bytes=RESULT_CACHE_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()  # key -> (result, nbytes)
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, result):
+        size = _nbytes(result)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self.entries[key] = (result, size)
+            self.nbytes += size
+            while self.nbytes > self.budget_bytes and len(self.entries) > 1:
+                _, (_, old_size) = self.entries.popitem(last=False)
+                self.nbytes -= old_size
+
+    def get_or_compute(self, key, compute):
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        """Return the number of cached results and their total size in bytes."""
+        with self.lock:
+            return {"entries": len(self.entries), "nbytes": self.nbytes, "budget_bytes": self.budget_bytes}
+
+
+@st.cache_resource
+def result_cache():
+    """Return the ResultCache shared by all sessions of this server process."""
+    return ResultCache()
+
+
+def stl_components(series, values, period, seasonal, trend, robust, engine="exact"):
+    """STL components of one series from memory or the disk cache, fitted in this process on a miss.
+
+    Only the requested series is fitted, warming every series of a year is left to
+    scripts/precompute_stl.py.
+    """
+    key = ("stl",) + stl_key(series, values, period, seasonal, trend, robust, engine)
+    memo = result_cache()
+    result = memo.get(key)
+    if result is None:
+        disk = STLCache()
+        result = disk.get(key[1:])
+        if result is None:
+            result = fit_stl(values, period, seasonal, trend, robust, engine)
+            disk.put(key[1:], result)
+        memo.put(key, result)
+    return result
+
+
+### SPECTROGRAMS ###
+
+# Largest heatmap grid handed to Plotly, about the pixel size of the plot
+SPECTROGRAM_MAX_TIMES = 700
+SPECTROGRAM_MAX_FREQS = 300
+
+
+@lru_cache(maxsize=32)
+def _stft_window(window_length):
+    # scipy.signal.stft's default window (periodic Hann), built once per length
+    return get_window("hann", window_length).astype(np.float32)
+
+
+def batch_stft(values, fs, window_length, window_overlap):
+    """STFT magnitudes of many equal-length series in one batched real-FFT call.
+
+    values is (series, hours) or one series. Follows scipy.signal.stft's defaults: periodic
+    Hann window, zero extension of half a window at both ends, zero padding to whole
+    segments and 'spectrum' scaling. Returns (frequencies, segment times, float32
+    magnitudes of shape (series, frequencies, times)).
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float32))
+    step = window_length - window_overlap
+    half = window_length // 2
+    padded = np.pad(values, ((0, 0), (half, half)))
+    padded = np.pad(padded, ((0, 0), (0, -(padded.shape[1] - window_length) % step)))
+
+    window = _stft_window(window_length)
+    segments = sliding_window_view(padded, window_length, axis=1)[:, ::step]  # (series, times, window)
+    spectrum = sp_fft.rfft(segments * window, axis=-1, workers=-1)
+    magnitude = np.abs(spectrum).transpose(0, 2, 1) / window.sum()
+
+    f = sp_fft.rfftfreq(window_length, 1 / fs)
+    t = np.arange(segments.shape[1]) * step / fs
+    return f, t, magnitude.astype(np.float32, copy=False)
+
+
+def stft_shape(n, window_length, window_overlap):
+    """(frequencies, segment times) of the unpooled batch_stft grid of an n-point series."""
+    step = window_length - window_overlap
+    padded = n + 2 * (window_length // 2)
+    return window_length // 2 + 1, -(-(padded - window_length) // step) + 1
+
+
+def pool_axis(coords, values, axis, max_size):
+    """Mean-pool `values` along `axis` (and its coordinates) into at most max_size bins."""
+    n = len(coords)
+    if n <= max_size:
+        return coords, values
+    edges = np.linspace(0, n, max_size + 1).astype(np.int64)
+    starts, counts = edges[:-1], np.diff(edges)
+    shape = [1] * values.ndim
+    shape[axis] = max_size
+    pooled = np.add.reduceat(values, starts, axis=axis) / counts.reshape(shape).astype(values.dtype)
+    return np.add.reduceat(coords, starts) / counts, pooled
+
+
+def spectrogram(values, fs, window_length, window_overlap,
+                max_times=SPECTROGRAM_MAX_TIMES, max_freqs=SPECTROGRAM_MAX_FREQS):
+    """Memoized log1p STFT magnitude of one series (1-D) or many series (2-D), pooled to the plot grid.
+
+    Returns (frequencies, segment times, float32 log magnitude of shape (series, frequencies, times)).
+    """
+    def compute():
+        f, t, magnitude = batch_stft(values, fs, window_length, window_overlap)
+        magnitude = np.log1p(magnitude)
+        f, magnitude = pool_axis(f, magnitude, 1, max_freqs)
+        t, magnitude = pool_axis(t, magnitude, 2, max_times)
+        return f, t, magnitude
+
+    key = ("stft", fs, int(window_length), int(window_overlap), max_times, max_freqs, series_fingerprint(values))
+    return result_cache().get_or_compute(key, compute)
@@ -0,0 +1,14 @@
+import numpy as np
+
+from geo_utils import area_layer, load_price_areas
+
+
+def test_area_colormap_has_one_colour_per_bin():
+    # Values just above the last inner edge and the maximum must share the top bin's colour
+    values = {"NO1": 120.0, "NO2": 340.0, "NO3": 80.0, "NO4": 150.0, "NO5": 260.0}
+    bins = list(np.linspace(min(values.values()), max(values.values()), 6))
+    _, colormap = area_layer(load_price_areas(), values, bins)
+
+    eps = (bins[-1] - bins[-2]) * 1e-6
+    assert len(colormap.colors) == len(bins) - 1
+    assert colormap(bins[-2] + eps) == colormap(bins[-1])
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from snow_utils import snow_season_sums, wind_transport
+
+
+def test_season_sums_skip_missing_hours():
+    # Hours with NaN weather must leave the sums as a NaN-skipping pandas .sum() would
+    time = pd.date_range("2020-07-01", "2022-06-30 23:00", freq="h")
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"time": time, "temperature_2m": rng.normal(0, 5, len(time)),
+                       "precipitation": rng.exponential(0.2, len(time)),
+                       "wind_speed_10m": rng.gamma(2, 3, len(time)),
+                       "wind_direction_10m": rng.uniform(0, 360, len(time))})
+    df.loc[[100, 9000], "temperature_2m"] = -5.0
+    df.loc[[100, 9000], "precipitation"] = np.nan
+    df.loc[[200, 9100], "wind_speed_10m"] = np.nan
+    df.loc[[300], "wind_direction_10m"] = np.nan
+
+    sums = snow_season_sums(df)
+    season = df["time"].dt.year - (df["time"].dt.month <= 6)
+    swe = df["precipitation"].where(df["temperature_2m"] < 1, 0.0)
+    qu = pd.Series(wind_transport(df["wind_speed_10m"]))
+    np.testing.assert_allclose(sums["swe"], swe.groupby(season).sum())
+    np.testing.assert_allclose(sums["qupot"], qu.groupby(season).sum())
+    np.testing.assert_allclose(sums["month_qupot"].sum(axis=1), sums["qupot"])
+    np.testing.assert_allclose(sums["sector_qupot"].sum(axis=1),
+                               qu[df["wind_direction_10m"].notna()].groupby(season).sum())
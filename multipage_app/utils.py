@@ -1,11 +1,25 @@
 import streamlit as st
 import pymongo
 import pandas as pd
-import pandas as pd
-import requests_cache
-import openmeteo_requests
-from retry_requests import retry
-from datetime import date
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import numpy as np
+import itertools
+import json
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Weather data lives in weather_utils (no MongoDB needed), re-exported for the pages
+from weather_utils import (DATA, WEATHER_VARIABLES, WEATHER_CUBE_YEARS, api_call, get_weather,
+                           weather_store, weather_cell, month_rows, daily_by_year, get_coords_by_price_code,
+                           area_name)
 
 
 # MongoDB connection
@@ -15,133 +29,901 @@ def init_connection():
 
 client = init_connection()
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
-@st.cache_data(ttl=600)
-def get_production_data(year: int = None, start_date: datetime = None, end_date: datetime = None):
-    database = client['ind320_production_db']
-    collection = database['ind320_production_table_d4']
-    
-    query = {}
+def get_production_data(year: int = None, start_date: datetime = None, end_date: datetime = None,
+                        columns=None, filters=None):
+    """Load hourly production rows, projected to `columns` (default: all schema columns).
+
+    filters: {column: value or list of values}, e.g. {"priceArea": "NO1"}, applied in the query.
+    """
+    return get_elhub_data("production", year, start_date, end_date, columns, filters)
+
+
+def get_consumption_data(year: int = None, start_date: datetime = None, end_date: datetime = None,
+                         columns=None, filters=None):
+    """Load hourly consumption rows, projected to `columns` (default: all schema columns).
+
+    filters: {column: value or list of values}, e.g. {"priceArea": "NO1"}, applied in the query.
+    """
+    return get_elhub_data("consumption", year, start_date, end_date, columns, filters)
+
+
+def get_elhub_data(dataset, year=None, start_date=None, end_date=None, columns=None, filters=None):
+    """Load the rows of an Elhub dataset with startTime in `year` or in [start_date, end_date).
+
+    Rows are sliced from the whole-year blocks held by the process-wide range_cache.
+    """
+    start_date, end_date = _interval(year, start_date, end_date)
+    schema = select_schema(dataset, columns)
+    table = range_cache().get(dataset, start_date, end_date, schema, _value_filters(filters))
+    return table.to_pandas(coerce_temporal_nanoseconds=True)
+
+
+def get_year_series(dataset, year):
+    """Return {(dataset, year, priceArea, group): quantityKwh array} for every series of a year.
+
+    Values are in startTime order, the same order the filtered loaders return.
+    """
+    group_col = ELHUB_DATASETS[dataset]["group_col"]
+    df = get_elhub_data(dataset, year, columns=["priceArea", group_col, "quantityKwh"])
+    return {(dataset, year, area, group): values["quantityKwh"].to_numpy()
+            for (area, group), values in df.groupby(["priceArea", group_col], sort=True)}
+
+
+def _interval(year=None, start_date=None, end_date=None):
+    """Return the half-open [start, end) of a year or a date range, (None, None) for all rows."""
     if year is not None:
-        query = {
-            "startTime": {
-                "$gte": datetime(year, 1, 1),
-                "$lt": datetime(year + 1, 1, 1)
-            }
-        }
-    elif start_date and end_date:
-        query = {
-            "startTime": {
-                "$gte": start_date,
-                "$lt": end_date
-            }
-        }
-    
-    items = list(collection.find(query))
-    df = pd.DataFrame(items)
-    
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    if start_date and end_date:
+        return start_date, end_date
+    return None, None
+
+
+# Filters are lists of (column, op, value) tuples, the DNF form pyarrow understands,
+# and are translated to MongoDB predicates when querying the collections directly
+_MONGO_OPS = {"==": "$eq", "!=": "$ne", "<": "$lt", "<=": "$lte", ">": "$gt", ">=": "$gte", "in": "$in"}
+
+
+def _time_filters(year=None, start_date=None, end_date=None):
+    """Return half-open startTime filters for a year or a [start_date, end_date) range."""
+    start_date, end_date = _interval(year, start_date, end_date)
+    if start_date is None:
+        return []
+    return [("startTime", ">=", start_date), ("startTime", "<", end_date)]
+
+
+def _value_filters(filters):
+    """Return filters for {column: value or list of values}."""
+    result = []
+    for col, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            result.append((col, "in", list(value)))
+        else:
+            result.append((col, "==", value))
+    return result
+
+
+def _mongo_query(filters):
+    """Translate (column, op, value) filters into a MongoDB query document."""
+    query = {}
+    for col, op, value in filters:
+        query.setdefault(col, {})[_MONGO_OPS[op]] = value
+    return query
+
+
+### INTERVAL QUERIES ###
+
+# Worker threads of the interval-query engine. Sub-queries wait on the network, not the CPU,
+# and share the connection pool of the one MongoClient.
+INTERVAL_WORKERS = max(4, os.cpu_count() or 1)
+
+
+def month_chunks(start, end):
+    """Split [start, end) at calendar month boundaries."""
+    chunks = []
+    lo = start
+    while lo < end:
+        hi = datetime(lo.year + lo.month // 12, lo.month % 12 + 1, 1)
+        chunks.append((lo, min(hi, end)))
+        lo = hi
+    return chunks
+
+
+def query_interval(collection, schema, start=None, end=None, filters=()):
+    """Load the rows of a collection with startTime in [start, end) as parallel per-month sub-queries.
+
+    Missing bounds default to the first/last startTime in the collection. The monthly
+    tables are merged in time order.
+    """
+    if start is None or end is None:
+        first = collection.find_one({}, {"_id": 0, "startTime": 1}, sort=[("startTime", 1)])
+        last = collection.find_one({}, {"_id": 0, "startTime": 1}, sort=[("startTime", -1)])
+        if first is None:
+            return schema.empty_table()
+        start = start or first["startTime"]
+        end = end or last["startTime"] + timedelta(hours=1)
+
+    def load_chunk(chunk):
+        query = _mongo_query([("startTime", ">=", chunk[0]), ("startTime", "<", chunk[1])] + list(filters))
+        return load_columns(collection, query, schema)
+
+    with ThreadPoolExecutor(max_workers=INTERVAL_WORKERS) as pool:
+        tables = list(pool.map(load_chunk, month_chunks(start, end)))
+    return pa.concat_tables(tables) if tables else schema.empty_table()
+
+
+### LOCAL PARQUET MIRROR ###
+
+# Serve the Elhub loaders from a local Parquet copy of the collections.
+USE_LOCAL_MIRROR = True
+MIRROR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".elhub_mirror")
+
+# Days before the high-water mark that every sync reads again, picking up late or corrected
+# rows. Changes to older hours only reach the mirror after deleting it for a full resync.
+MIRROR_RESYNC_DAYS = 7
+
+# Hive partitions of the mirror, e.g. .elhub_mirror/production/year=2022/priceArea=NO1/
+MIRROR_PARTITIONING = ds.partitioning(pa.schema([("year", pa.int32()), ("priceArea", pa.string())]),
+                                      flavor="hive")
+
+
+def _mirror_state_path(dataset):
+    return os.path.join(MIRROR_DIR, dataset, "_sync_state.json")
+
+
+def _read_mirror_state(dataset):
+    state_path = _mirror_state_path(dataset)
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def _rewrite_partition(part_dir, table, since):
+    """Replace the rows of a partition from `since` on with `table`, as one compacted file."""
+    file_schema = table.schema
+    kept = file_schema.empty_table()
+    if os.path.isdir(part_dir):
+        kept = pq.read_table(part_dir, schema=file_schema)
+        if since is not None:
+            kept = kept.filter(pc.less(kept["startTime"], pa.scalar(since, file_schema.field("startTime").type)))
+    merged = pa.concat_tables([kept, table]).sort_by("startTime")
+
+    # The new file replaces part-0 atomically, the parts written by earlier syncs are removed after it
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, "part-0.parquet")
+    tmp_path = os.path.join(part_dir, ".part-0.parquet.tmp")
+    pq.write_table(merged, tmp_path)
+    os.replace(tmp_path, path)
+    for name in os.listdir(part_dir):
+        if name.endswith(".parquet") and name != "part-0.parquet":
+            os.remove(os.path.join(part_dir, name))
+
+
+def sync_mirror(dataset):
+    """Sync the mirror with the collection and return the rows (re)written.
+
+    Reads the hours after the startTime high-water mark and the MIRROR_RESYNC_DAYS before
+    it, and rewrites every year/priceArea partition from the start of that window as a
+    single file, so late or corrected rows replace the mirrored ones and partitions do
+    not pile up small files.
+    """
+    state = _read_mirror_state(dataset)
+    high_water_mark = datetime.fromisoformat(state["high_water_mark"]) if state else None
+    since = high_water_mark - timedelta(days=MIRROR_RESYNC_DAYS) if high_water_mark else None
+
+    # The first/last startTime lookups and the monthly chunks are served by the startTime index
+    ensure_indexes()
+    collection = _elhub_collection(dataset)
+    table = query_interval(collection, ELHUB_SCHEMAS[dataset], since)
+    if table.num_rows == 0 and high_water_mark is None:
+        return 0
+
+    # Every partition from the window on is rewritten, including those that lost all their rows
+    root = os.path.join(MIRROR_DIR, dataset)
+    years = pc.year(table["startTime"]).cast(pa.int32())
+    partitions = set(zip(years.to_pylist(), table["priceArea"].to_pylist()))
+    if since is not None and os.path.isdir(root):
+        for year_dir in os.listdir(root):
+            if year_dir.startswith("year=") and int(year_dir.split("=")[1]) >= since.year:
+                partitions.update((int(year_dir.split("=")[1]), area_dir.split("=")[1])
+                                  for area_dir in os.listdir(os.path.join(root, year_dir))
+                                  if area_dir.startswith("priceArea="))
+
+    file_table = table.drop_columns(["priceArea"])
+    for year, area in sorted(partitions):
+        mask = pc.and_(pc.equal(years, year), pc.equal(table["priceArea"], area))
+        part_dir = os.path.join(root, f"year={year}", f"priceArea={area}")
+        _rewrite_partition(part_dir, file_table.filter(mask), since)
+
+    new_mark = pc.max(table["startTime"]).as_py() if table.num_rows else high_water_mark
+    state_path = _mirror_state_path(dataset)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump({"high_water_mark": new_mark.isoformat(),
+                   "resynced_from": since.isoformat() if since else None,
+                   "synced_at": datetime.now().isoformat()}, f)
+    os.replace(state_path + ".tmp", state_path)
+    return table.num_rows
+
+
+@st.cache_resource(ttl=600)
+def ensure_mirror(dataset):
+    """Sync the mirror of a dataset at most once per ttl and server process.
+
+    When MongoDB cannot be reached, an existing mirror is served as it is until the next try.
+    """
+    try:
+        return sync_mirror(dataset)
+    except pymongo.errors.PyMongoError as e:
+        if _read_mirror_state(dataset) is None:
+            raise
+        warnings.warn(f"Could not sync the {dataset} mirror, serving the existing one: {e}")
+        return 0
+
+
+def read_mirror(dataset, schema, filters=None):
+    """Read the schema columns of the mirror rows matching `filters`, memory-mapping the files."""
+    path = os.path.join(MIRROR_DIR, dataset)
+    if not os.path.isdir(path):
+        return schema.empty_table()
+
+    # Derive year partition bounds from the startTime filters so whole years are skipped
+    filters = list(filters or [])
+    for col, op, value in list(filters):
+        if col == "startTime" and op in (">=", ">"):
+            filters.append(("year", ">=", value.year))
+        elif col == "startTime" and op in ("<", "<="):
+            at_year_start = op == "<" and (value.month, value.day) == (1, 1) and value.time() == datetime.min.time()
+            filters.append(("year", "<=", value.year - 1 if at_year_start else value.year))
+
+    table = pq.read_table(path, columns=schema.names, filters=filters or None,
+                          partitioning=MIRROR_PARTITIONING, memory_map=True)
+    return table.select(schema.names).cast(schema)
+
+
+### RANGE-AWARE DATA CACHE ###
+
+# Memory budget of the cached year blocks per server process
+CACHE_BUDGET_BYTES = 512 * 2**20
+
+# Seconds before a block of a year that is not complete yet is reloaded (new hours may arrive)
+INCOMPLETE_BLOCK_TTL = 600
+
+
+def _load_block(dataset, year, filters=()):
+    """Load all columns of the rows of one year of a dataset matching `filters`, sorted by startTime.
+
+    The filters are pushed down into the Parquet read or the MongoDB query.
+    """
+    schema = ELHUB_SCHEMAS[dataset]
+    if USE_LOCAL_MIRROR:
+        ensure_mirror(dataset)
+        table = read_mirror(dataset, schema, _time_filters(year) + list(filters))
+    else:
+        collection = _elhub_collection(dataset)
+        table = query_interval(collection, schema, *_interval(year), filters=filters)
+    return table.sort_by("startTime")
+
+
+def _filters_key(filters):
+    """Hashable form of (column, op, value) filters, part of the block cache key."""
+    return tuple(sorted((col, op, tuple(value) if isinstance(value, list) else value)
+                        for col, op, value in filters))
+
+
+def _available_years(dataset):
+    """Return the years that hold rows of a dataset."""
+    if USE_LOCAL_MIRROR:
+        ensure_mirror(dataset)
+        path = os.path.join(MIRROR_DIR, dataset)
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(name.split("=")[1]) for name in os.listdir(path) if name.startswith("year="))
+
+    collection = _elhub_collection(dataset)
+    first = collection.find_one({}, {"_id": 0, "startTime": 1}, sort=[("startTime", 1)])
+    last = collection.find_one({}, {"_id": 0, "startTime": 1}, sort=[("startTime", -1)])
+    if first is None:
+        return []
+    return list(range(first["startTime"].year, last["startTime"].year + 1))
+
+
+class RangeCache:
+    """LRU cache of whole-year blocks per dataset and filter that answers any range query by slicing them.
+
+    A block holds the year's rows matching one set of area/group filters, loaded with
+    the filters pushed down to the query. While the unfiltered block of a year is
+    cached, filtered requests are filtered from it instead, and loading it drops the
+    filtered blocks of that year, so the same rows are not held twice. Any date range
+    within the year is sliced from a block, and the least recently used blocks are
+    evicted once their total size exceeds the memory budget.
+    """
+
+    def __init__(self, budget_bytes=CACHE_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.blocks = OrderedDict()  # (dataset, year, filters key) -> (table, startTime array, expires)
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def _cached(self, key):
+        # Caller holds the lock
+        entry = self.blocks.get(key)
+        if entry is None or entry[2] <= time.monotonic():
+            return None
+        self.blocks.move_to_end(key)
+        return entry
+
+    def _drop(self, key):
+        # Caller holds the lock
+        old = self.blocks.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[0].nbytes + old[1].nbytes
+
+    def block(self, dataset, year, filters=()):
+        """Return the (table, startTime array) block of a year and filters, loading it on a miss."""
+        key = (dataset, year, _filters_key(filters))
+        whole_key = (dataset, year, ())
+        with self.lock:
+            entry = self._cached(key)
+            if entry is not None:
+                return entry[0], entry[1]
+            whole = self._cached(whole_key) if filters else None
+        if whole is not None:
+            table = whole[0].filter(pq.filters_to_expression(list(filters)))
+            return table, table["startTime"].to_numpy()
+
+        table = _load_block(dataset, year, filters)
+        times = table["startTime"].to_numpy()
+        complete = len(times) and times[-1] >= np.datetime64(datetime(year, 12, 31, 23))
+        expires = float("inf") if complete else time.monotonic() + INCOMPLETE_BLOCK_TTL
+
+        with self.lock:
+            self._drop(key)
+            if key == whole_key:
+                for other in [k for k in self.blocks if k[:2] == (dataset, year)]:
+                    self._drop(other)
+            self.blocks[key] = (table, times, expires)
+            self.nbytes += table.nbytes + times.nbytes
+            while self.nbytes > self.budget_bytes and len(self.blocks) > 1:
+                _, (old_table, old_times, _) = self.blocks.popitem(last=False)
+                self.nbytes -= old_table.nbytes + old_times.nbytes
+        return table, times
+
+    def get(self, dataset, start, end, schema, filters=()):
+        """Return the schema columns of the rows with startTime in [start, end) matching `filters`."""
+        if start is None:
+            years = _available_years(dataset)
+        else:
+            years = range(start.year, (end - timedelta(microseconds=1)).year + 1)
+
+        pieces = []
+        for year in years:
+            table, times = self.block(dataset, year, filters)
+            lo = 0 if start is None else np.searchsorted(times, np.datetime64(start), side="left")
+            hi = len(times) if end is None else np.searchsorted(times, np.datetime64(end), side="left")
+            if hi > lo:
+                pieces.append(table.slice(lo, hi - lo))
+
+        if not pieces:
+            return schema.empty_table()
+        return pa.concat_tables(pieces).select(schema.names)
+
+    def stats(self):
+        """Return the cached block keys and their total size in bytes."""
+        with self.lock:
+            return {"blocks": list(self.blocks), "nbytes": self.nbytes, "budget_bytes": self.budget_bytes}
+
+
+@st.cache_resource
+def range_cache():
+    """Return the RangeCache shared by all sessions of this server process."""
+    return RangeCache()
+
+
+### SERVER-SIDE AGGREGATION ###
+
+# Elhub collections in MongoDB and their group column
+ELHUB_DATASETS = {
+    "production": {"collection": "ind320_production_table_d4", "group_col": "productionGroup"},
+    "consumption": {"collection": "ind320_consumption_table", "group_col": "consumptionGroup"},
+}
+
+# Aggregate functions supported by get_aggregated_data mapped to MongoDB accumulators.
+# All skip missing quantityKwh, so count is the number of hours with a value.
+AGG_FUNCS = {"sum": "$sum", "mean": "$avg", "min": "$min", "max": "$max", "count": "$sum"}
+
+# $sum operand counting the documents with a numeric quantityKwh
+_COUNT_VALUES = {"$cond": [{"$isNumber": "$quantityKwh"}, 1, 0]}
+
+# Time buckets supported by get_aggregated_data (units of $dateTrunc)
+TIME_BUCKETS = ["hour", "day", "week", "month", "year"]
+
+
+def _check_aggregation(time_bucket, aggs):
+    for func in aggs.values():
+        if func not in AGG_FUNCS:
+            raise ValueError(f"Unsupported aggregate '{func}', use one of {list(AGG_FUNCS)}")
+    if time_bucket is not None and time_bucket not in TIME_BUCKETS:
+        raise ValueError(f"Unsupported time bucket '{time_bucket}', use one of {TIME_BUCKETS}")
+
+
+def build_aggregation_pipeline(group_by=(), time_bucket=None, aggs=None, match=None):
+    """Build a $match/$group/$project pipeline over quantityKwh."""
+    aggs = aggs or {"quantityKwh": "sum"}
+    _check_aggregation(time_bucket, aggs)
+
+    group_id = {key: f"${key}" for key in group_by}
+    if time_bucket is not None:
+        trunc = {"date": "$startTime", "unit": time_bucket}
+        if time_bucket == "week":
+            trunc["startOfWeek"] = "monday"
+        group_id["startTime"] = {"$dateTrunc": trunc}
+
+    group_stage = {"_id": group_id}
+    for name, func in aggs.items():
+        group_stage[name] = {AGG_FUNCS[func]: _COUNT_VALUES if func == "count" else "$quantityKwh"}
+
+    project_stage = {"_id": 0}
+    project_stage.update({key: f"$_id.{key}" for key in group_id})
+    project_stage.update({name: 1 for name in aggs})
+
+    pipeline = []
+    if match:
+        pipeline.append({"$match": match})
+    pipeline.append({"$group": group_stage})
+    pipeline.append({"$project": project_stage})
+    if group_id:
+        pipeline.append({"$sort": {key: 1 for key in group_id}})
+    return pipeline
+
+
+def _bucket_times(times, time_bucket):
+    """Truncate a datetime Series to the start of its time bucket, like $dateTrunc."""
+    if time_bucket in ("hour", "day"):
+        return times.dt.floor("h" if time_bucket == "hour" else "D")
+    period = {"week": "W-SUN", "month": "M", "year": "Y"}[time_bucket]
+    return times.dt.to_period(period).dt.start_time
+
+
+def aggregate_frame(df, group_by=(), time_bucket=None, aggs=None):
+    """Pandas equivalent of build_aggregation_pipeline for rows already loaded locally."""
+    aggs = aggs or {"quantityKwh": "sum"}
+    _check_aggregation(time_bucket, aggs)
+
+    keys = list(group_by)
+    if time_bucket is not None:
+        df = df.assign(startTime=_bucket_times(df["startTime"], time_bucket))
+        keys.append("startTime")
+
+    named = {name: ("quantityKwh", func) for name, func in aggs.items()}
+    if keys:
+        return df.groupby(keys, sort=True).agg(**named).reset_index()
+    return pd.DataFrame({name: [df[col].agg(func)] for name, (col, func) in named.items()})
+
+
+@st.cache_data(ttl=600)
+def get_aggregated_data(dataset="production", group_by=(), time_bucket=None, aggs=None,
+                        year: int = None, start_date: datetime = None, end_date: datetime = None,
+                        filters=None):
+    """Aggregate quantityKwh next to the data and return only the grouped rows.
+
+    group_by: columns to group on, e.g. ["priceArea", "productionGroup"].
+    time_bucket: one of TIME_BUCKETS to also group startTime by, or None.
+    aggs: {output column: function} with functions from AGG_FUNCS, default {"quantityKwh": "sum"}.
+    filters: {column: value or list of values} applied before grouping.
+    """
+    aggs = aggs or {"quantityKwh": "sum"}
+
+    # Answer from the coarsest materialized rollup that covers the request
+    start, end = _interval(year, start_date, end_date)
+    grain = route_aggregation(dataset, group_by, time_bucket, start, end, filters)
+    if grain is not None:
+        rollup = read_rollup(dataset, grain, start, end, filters)
+        return aggregate_rollup(rollup, group_by, time_bucket, aggs)
+
+    if USE_LOCAL_MIRROR:
+        columns = list(dict.fromkeys(list(group_by) + ["startTime", "quantityKwh"]))
+        df = get_elhub_data(dataset, year, start_date, end_date, columns, filters)
+        return aggregate_frame(df, group_by, time_bucket, aggs)
+
+    query_filters = _time_filters(year, start_date, end_date) + _value_filters(filters)
+
+    collection = _elhub_collection(dataset)
+    pipeline = build_aggregation_pipeline(list(group_by), time_bucket, aggs, _mongo_query(query_filters))
+
+    items = list(collection.aggregate(pipeline, allowDiskUse=True))
+    columns = list(group_by) + (["startTime"] if time_bucket is not None else []) + list(aggs)
+    df = pd.DataFrame(items, columns=columns)
+
     if 'startTime' in df.columns:
         df['startTime'] = pd.to_datetime(df['startTime'])
     return df
 
 
-@st.cache_data(ttl=600)
-def get_consumption_data(year: int = None, start_date: datetime = None, end_date: datetime = None):
+### MATERIALIZED ROLLUPS ###
+
+# Daily and monthly sum/count/min/max of quantityKwh per (priceArea, group), kept beside
+# the hourly data: as Parquet files next to the mirror, or as "<collection>_<grain>"
+# collections in MongoDB. Every AGG_FUNCS aggregate can be recombined from them.
+ROLLUP_GRAINS = ["month", "day"]  # coarsest first, the order the router tries them
+ROLLUP_DIR = os.path.join(MIRROR_DIR, "rollups")
+ROLLUP_PARTIALS = {"sum": "quantityKwh_sum", "count": "quantityKwh_count",
+                   "min": "quantityKwh_min", "max": "quantityKwh_max"}
+
+# Requested time buckets each rollup grain can be regrouped into
+_ROLLUP_BUCKETS = {"month": {None, "month", "year"}, "day": {None, "day", "week", "month", "year"}}
+
+
+def _rollup_path(dataset, grain):
+    return os.path.join(ROLLUP_DIR, f"{dataset}_{grain}.parquet")
+
+
+def _grain_start(value, grain):
+    """Return the start of the day or month bucket holding a datetime."""
+    value = datetime.combine(value.date(), datetime.min.time())
+    return value.replace(day=1) if grain == "month" else value
+
+
+def rollup_frame(df, group_col, grain):
+    """Roll hourly rows (or finer rollup rows) up to one row per (priceArea, group, grain bucket).
+
+    Hours with a missing quantityKwh add nothing to any partial, the count included.
+    """
+    if "quantityKwh" in df.columns:
+        df = df.assign(quantityKwh_sum=df["quantityKwh"], quantityKwh_count=df["quantityKwh"].notna().astype(int),
+                       quantityKwh_min=df["quantityKwh"], quantityKwh_max=df["quantityKwh"])
+    df = df.assign(startTime=_bucket_times(df["startTime"], grain))
+    rolled = df.groupby(["priceArea", group_col, "startTime"], sort=True).agg(
+        quantityKwh_sum=("quantityKwh_sum", "sum"), quantityKwh_count=("quantityKwh_count", "sum"),
+        quantityKwh_min=("quantityKwh_min", "min"), quantityKwh_max=("quantityKwh_max", "max"))
+    return rolled.reset_index()
+
+
+def _refresh_local_rollups(dataset):
+    """Recompute the local rollup buckets touched by the mirror syncs since the last refresh."""
+    group_col = ELHUB_DATASETS[dataset]["group_col"]
+    state_path = os.path.join(ROLLUP_DIR, f"_{dataset}_state.json")
+    mirror_state = _read_mirror_state(dataset)
+    if mirror_state is None:
+        return 0
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            if json.load(f) == mirror_state:
+                return 0
+    resynced_from = mirror_state.get("resynced_from")
+    resynced_from = datetime.fromisoformat(resynced_from) if resynced_from else None
+
+    # The last bucket of each rollup may have been partial, and the sync may have rewritten
+    # the hours from resynced_from on, so the buckets from the earlier of the two are rebuilt
+    os.makedirs(ROLLUP_DIR, exist_ok=True)
+    finer, rows = None, 0
+    for grain in reversed(ROLLUP_GRAINS):
+        path = _rollup_path(dataset, grain)
+        kept = pd.read_parquet(path) if os.path.exists(path) else None
+        since = _grain_start(kept["startTime"].max(), grain) if kept is not None and len(kept) else None
+        if since is not None and resynced_from is not None:
+            since = min(since, _grain_start(resynced_from, grain))
+        if finer is None:
+            filters = [("startTime", ">=", since)] if since is not None else None
+            source = read_mirror(dataset, select_schema(dataset, ["priceArea", group_col, "startTime", "quantityKwh"]),
+                                 filters).to_pandas(coerce_temporal_nanoseconds=True)
+        else:
+            source = finer if since is None else finer[finer["startTime"] >= since]
+        rolled = rollup_frame(source, group_col, grain)
+        if kept is not None and since is not None:
+            rolled = pd.concat([kept[kept["startTime"] < since], rolled], ignore_index=True)
+        rolled = rolled.sort_values(["startTime", "priceArea", group_col], ignore_index=True)
+
+        rolled.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        finer, rows = rolled, rows + len(rolled)
+
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(mirror_state, f)
+    os.replace(state_path + ".tmp", state_path)
+    return rows
+
+
+def _refresh_mongo_rollups(dataset):
+    """Recompute the rollup collection buckets from their last (possibly partial) bucket on."""
+    ensure_indexes()
     database = client['ind320_production_db']
-    collection = database['ind320_consumption_table']
-    
-    query = {}
-    if year is not None:
-        query = {
-            "startTime": {
-                "$gte": datetime(year, 1, 1),
-                "$lt": datetime(year + 1, 1, 1)
-            }
-        }
-    elif start_date and end_date:
-        query = {
-            "startTime": {"$gte": start_date},
-            "endTime": {"$lte": end_date}
-        }
-    
-    items = list(collection.find(query))
-    df = pd.DataFrame(items)
-    
-    time_columns = ["startTime", "endTime"]
-    for col in time_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col])
+    collection_name = ELHUB_DATASETS[dataset]["collection"]
+    group_col = ELHUB_DATASETS[dataset]["group_col"]
+    for grain in ROLLUP_GRAINS:
+        target = database[f"{collection_name}_{grain}"]
+        last = target.find_one({}, {"_id": 0, "startTime": 1}, sort=[("startTime", -1)])
+        key = {"priceArea": "$priceArea", group_col: f"${group_col}",
+               "startTime": {"$dateTrunc": {"date": "$startTime", "unit": grain}}}
+        pipeline = [
+            {"$group": {"_id": key,
+                        "quantityKwh_sum": {"$sum": "$quantityKwh"}, "quantityKwh_count": {"$sum": _COUNT_VALUES},
+                        "quantityKwh_min": {"$min": "$quantityKwh"}, "quantityKwh_max": {"$max": "$quantityKwh"}}},
+            {"$set": {name: f"$_id.{name}" for name in key}},
+            {"$merge": {"into": target.name, "whenMatched": "replace"}},
+        ]
+        if last is not None:
+            pipeline.insert(0, {"$match": {"startTime": {"$gte": last["startTime"]}}})
+        database[collection_name].aggregate(pipeline, allowDiskUse=True)
+
+
+def refresh_rollups(dataset):
+    """Bring the rollups of a dataset up to date with its hourly rows."""
+    if USE_LOCAL_MIRROR:
+        ensure_mirror(dataset)
+        _refresh_local_rollups(dataset)
+    else:
+        _refresh_mongo_rollups(dataset)
+
+
+@st.cache_resource(ttl=600)
+def ensure_rollups(dataset):
+    """Refresh the rollups of a dataset at most once per ttl and server process."""
+    refresh_rollups(dataset)
+
+
+def route_aggregation(dataset, group_by=(), time_bucket=None, start=None, end=None, filters=None):
+    """Return the coarsest rollup grain that answers an aggregation exactly, or None for hourly rows.
+
+    A grain qualifies when the grouping and filter columns are rollup dimensions, the
+    requested time bucket is a multiple of the grain and the range starts and ends on
+    grain boundaries.
+    """
+    dimensions = {"priceArea", ELHUB_DATASETS[dataset]["group_col"]}
+    if not set(group_by) <= dimensions or not set(filters or {}) <= dimensions:
+        return None
+    for grain in ROLLUP_GRAINS:
+        if time_bucket in _ROLLUP_BUCKETS[grain] and all(
+                bound is None or bound == _grain_start(bound, grain) for bound in (start, end)):
+            return grain
+    return None
+
+
+def read_rollup(dataset, grain, start=None, end=None, filters=None):
+    """Return the rollup rows of a grain with startTime in [start, end) matching `filters`."""
+    ensure_rollups(dataset)
+    query_filters = _time_filters(start_date=start, end_date=end) + _value_filters(filters)
+    if USE_LOCAL_MIRROR:
+        path = _rollup_path(dataset, grain)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=["priceArea", ELHUB_DATASETS[dataset]["group_col"], "startTime",
+                                         *ROLLUP_PARTIALS.values()])
+        return pq.read_table(path, filters=query_filters or None).to_pandas(coerce_temporal_nanoseconds=True)
+
+    collection = client['ind320_production_db'][f"{ELHUB_DATASETS[dataset]['collection']}_{grain}"]
+    df = pd.DataFrame(list(collection.find(_mongo_query(query_filters), {"_id": 0})))
+    if 'startTime' in df.columns:
+        df['startTime'] = pd.to_datetime(df['startTime'])
     return df
 
 
-### METEOROLOGY DATA FROM OPEN METEO API ###
+def aggregate_rollup(rollup, group_by=(), time_bucket=None, aggs=None):
+    """aggregate_frame over rollup rows: sums and counts add up, min/max of min/max, mean = sum / count.
+
+    The counts are of the non-null hours, so the results equal aggregate_frame over the hourly rows.
+    """
+    aggs = aggs or {"quantityKwh": "sum"}
+    _check_aggregation(time_bucket, aggs)
+
+    keys = list(group_by)
+    if time_bucket is not None:
+        rollup = rollup.assign(startTime=_bucket_times(rollup["startTime"], time_bucket))
+        keys.append("startTime")
+
+    partial_funcs = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+    needed = {part for func in aggs.values() for part in (("sum", "count") if func == "mean" else (func,))}
+    named = {ROLLUP_PARTIALS[part]: (ROLLUP_PARTIALS[part], partial_funcs[part]) for part in needed}
+    if keys:
+        parts = rollup.groupby(keys, sort=True).agg(**named).reset_index()
+    else:
+        parts = pd.DataFrame({name: [rollup[col].agg(func)] for name, (col, func) in named.items()})
+
+    result = parts[keys].copy()
+    for name, func in aggs.items():
+        if func == "mean":
+            result[name] = parts["quantityKwh_sum"] / parts["quantityKwh_count"]
+        else:
+            result[name] = parts[ROLLUP_PARTIALS[func]]
+    return result
+
+
+### PREFIX-SUM INDEX ###
+
+class PrefixSumIndex:
+    """Cumulative hourly sums and value counts of quantityKwh per (priceArea, group).
+
+    The sum and count of any [start, end) are two lookups per series, however long the
+    range, so totals and means need no scan of the hours.
+    """
+
+    def __init__(self, df, group_col):
+        self.group_col = group_col
+        keys = df[["priceArea", group_col]].drop_duplicates().sort_values(["priceArea", group_col])
+        self.keys = keys.reset_index(drop=True)
+        series = pd.MultiIndex.from_frame(self.keys).get_indexer(pd.MultiIndex.from_frame(df[["priceArea", group_col]]))
+
+        self.t0 = df["startTime"].min().floor("h") if len(df) else pd.Timestamp(0)
+        hour = ((df["startTime"] - self.t0) // pd.Timedelta(hours=1)).to_numpy(dtype=np.int64)
+        self.hours = int(hour.max()) + 1 if len(df) else 0
+
+        # (series, hour + 1) cumulative arrays with a leading zero column, so a range is C[hi] - C[lo]
+        flat = series * self.hours + hour
+        size = len(self.keys) * self.hours
+        quantity = df["quantityKwh"].to_numpy(dtype=np.float64)
+        present = ~np.isnan(quantity)
+        shape = (len(self.keys), self.hours)
+        self.cum_sum = np.zeros((shape[0], shape[1] + 1))
+        self.cum_count = np.zeros((shape[0], shape[1] + 1), dtype=np.int64)
+        np.cumsum(np.bincount(flat, weights=np.nan_to_num(quantity), minlength=size).reshape(shape), axis=1, out=self.cum_sum[:, 1:])
+        np.cumsum(np.bincount(flat, weights=present, minlength=size).reshape(shape).astype(np.int64), axis=1,
+                  out=self.cum_count[:, 1:])
+
+    def _position(self, value, default):
+        # Index of the first hour with startTime >= value
+        if value is None:
+            return default
+        hours = np.ceil((pd.Timestamp(value) - self.t0) / pd.Timedelta(hours=1))
+        return int(np.clip(hours, 0, self.hours))
+
+    def totals(self, start=None, end=None):
+        """Return quantityKwh_sum and quantityKwh_count per (priceArea, group) with data in [start, end)."""
+        lo, hi = self._position(start, 0), self._position(end, self.hours)
+        hi = max(lo, hi)
+        result = self.keys.assign(quantityKwh_sum=self.cum_sum[:, hi] - self.cum_sum[:, lo],
+                                  quantityKwh_count=self.cum_count[:, hi] - self.cum_count[:, lo])
+        return result[result["quantityKwh_count"] > 0].reset_index(drop=True)
+
+
+@st.cache_resource(ttl=600)
+def prefix_sum_index(dataset):
+    """Build the PrefixSumIndex of a dataset once per ttl and server process."""
+    group_col = ELHUB_DATASETS[dataset]["group_col"]
+    df = get_elhub_data(dataset, columns=["priceArea", group_col, "startTime", "quantityKwh"])
+    return PrefixSumIndex(df, group_col)
 
-# City metadata
-DATA = {
-    'Oslo': {'PriceAreaCode': 'NO1', 'Longitude': 10.7461, 'Latitude': 59.9127},
-    'Kristiansand': {'PriceAreaCode': 'NO2', 'Longitude': 7.9956, 'Latitude': 58.1467},
-    'Trondheim': {'PriceAreaCode': 'NO3', 'Longitude': 10.3951, 'Latitude': 63.4305},
-    'Tromsø': {'PriceAreaCode': 'NO4', 'Longitude': 18.9551, 'Latitude': 69.6489},
-    'Bergen': {'PriceAreaCode': 'NO5', 'Longitude': 5.32415, 'Latitude': 60.39299},
+
+def get_range_totals(dataset, start_date=None, end_date=None):
+    """Sum and count of quantityKwh per (priceArea, group) over [start_date, end_date), from the prefix sums."""
+    return prefix_sum_index(dataset).totals(start_date, end_date)
+
+
+### INDEXES ###
+
+# Index specification of the Elhub collections. The first index mirrors the Cassandra
+# primary key ((priceArea, group), startTime) and serves area/group + time range queries,
+# the second serves time-only range queries. Both end with the remaining schema columns
+# so projected reads of those columns are covered (answered from the index alone).
+ELHUB_INDEXES = {
+    "production": [
+        [("priceArea", 1), ("productionGroup", 1), ("startTime", 1), ("quantityKwh", 1)],
+        [("startTime", 1), ("priceArea", 1), ("productionGroup", 1), ("quantityKwh", 1)],
+    ],
+    "consumption": [
+        [("priceArea", 1), ("consumptionGroup", 1), ("startTime", 1), ("quantityKwh", 1)],
+        [("startTime", 1), ("priceArea", 1), ("consumptionGroup", 1), ("quantityKwh", 1)],
+    ],
 }
 
-# Setup Open-Meteo client once
-_cache_session = requests_cache.CachedSession('.cache', expire_after=-1)
-_retry_session = retry(_cache_session, retries=5, backoff_factor=0.2)
-_openmeteo = openmeteo_requests.Client(session=_retry_session)
-
-@st.cache_data(show_spinner=False)
-def api_call(coords, year):
-    """Fetch hourly weather data for given coordinates and year."""
-    lat, lon = coords
-    start_date = date(year, 1, 1).strftime("%Y-%m-%d")
-    end_date = date(year, 12, 31).strftime("%Y-%m-%d")
-
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "start_date": start_date,
-        "end_date": end_date,
-        "hourly": ["temperature_2m", "precipitation", "wind_speed_10m",
-                   "wind_gusts_10m", "wind_direction_10m"],
-        "models": "era5",
-    }
-    responses = _openmeteo.weather_api(url, params=params)
-    response = responses[0]
-
-    hourly = response.Hourly()
-    hourly_data = {
-        "date": pd.date_range(
-            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=hourly.Interval()),
-            inclusive="left"
-        ),
-        "temperature_2m": hourly.Variables(0).ValuesAsNumpy(),
-        "precipitation": hourly.Variables(1).ValuesAsNumpy(),
-        "wind_speed_10m": hourly.Variables(2).ValuesAsNumpy(),
-        "wind_gusts_10m": hourly.Variables(3).ValuesAsNumpy(),
-        "wind_direction_10m": hourly.Variables(4).ValuesAsNumpy(),
+
+def _elhub_collection(dataset):
+    """Return the MongoDB collection of a dataset, creating the indexes first when pages query it directly.
+
+    With USE_LOCAL_MIRROR the pages read the Parquet mirror, and sync_mirror creates the
+    indexes its startTime queries need itself.
+    """
+    if not USE_LOCAL_MIRROR:
+        ensure_indexes()
+    return client['ind320_production_db'][ELHUB_DATASETS[dataset]["collection"]]
+
+
+@st.cache_resource
+def ensure_indexes():
+    """Create the ELHUB_INDEXES once per server process and return the index names."""
+    database = client['ind320_production_db']
+    names = []
+    for dataset, indexes in ELHUB_INDEXES.items():
+        collection = database[ELHUB_DATASETS[dataset]["collection"]]
+        models = [pymongo.IndexModel(keys, name="_".join(key for key, _ in keys)) for keys in indexes]
+        try:
+            names += collection.create_indexes(models)
+        except pymongo.errors.PyMongoError as e:
+            # A read-only database user cannot create indexes and an unreachable server
+            # raises here too, queries still work (or fail on their own) without them
+            warnings.warn(f"Could not create indexes on {collection.name}: {e}")
+    return names
+
+
+def _plan_indexes(plan):
+    """Return the index names used by the IXSCAN stages of a query plan."""
+    names = []
+    if isinstance(plan, dict):
+        if plan.get("stage") == "IXSCAN":
+            names.append(plan.get("indexName"))
+        for value in plan.values():
+            names += _plan_indexes(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            names += _plan_indexes(value)
+    return names
+
+
+def explain_query(dataset, columns=None, filters=None):
+    """Return explain() statistics of the MongoDB query for a projected, filtered read.
+
+    filters: (column, op, value) filters as built by the loaders.
+    """
+    collection = _elhub_collection(dataset)
+    schema = select_schema(dataset, columns)
+    projection = {"_id": 0, **{name: 1 for name in schema.names}}
+    plan = collection.find(_mongo_query(filters or []), projection).explain()
+
+    stats = plan["executionStats"]
+    return {
+        "indexes": sorted(set(_plan_indexes(plan["queryPlanner"]["winningPlan"]))),
+        "keys_examined": stats["totalKeysExamined"],
+        "docs_examined": stats["totalDocsExamined"],
+        "returned": stats["nReturned"],
+        "covered": stats["totalDocsExamined"] == 0 and stats["nReturned"] > 0,
+        "millis": stats["executionTimeMillis"],
     }
 
-    df = pd.DataFrame(hourly_data)
-    df['date'] = df['date'].dt.tz_localize(None)  # drop UTC
-    return df
 
 
-def get_coords_by_price_code(price_code):
-    """Return (lat, lon) for a given PriceAreaCode."""
-    for _, info in DATA.items():
-        if info['PriceAreaCode'] == price_code:
-            return info['Latitude'], info['Longitude']
+### COLUMNAR LOADING ###
+
+# Native BSON -> Arrow decoder (in requirements.txt), the pure pyarrow path below is the fallback without it
+try:
+    from pymongoarrow.api import Schema as _ArrowSchema, find_arrow_all as _find_arrow_all
+except ImportError:
+    _find_arrow_all = None
+
+# Typed columns of each Elhub collection (the BSON _id is never loaded)
+ELHUB_SCHEMAS = {
+    "production": pa.schema([
+        ("priceArea", pa.string()),
+        ("productionGroup", pa.string()),
+        ("startTime", pa.timestamp("ms")),
+        ("quantityKwh", pa.float64()),
+    ]),
+    "consumption": pa.schema([
+        ("priceArea", pa.string()),
+        ("consumptionGroup", pa.string()),
+        ("startTime", pa.timestamp("ms")),
+        ("endTime", pa.timestamp("ms")),
+        ("quantityKwh", pa.float64()),
+        ("meteringPointCount", pa.int64()),
+    ]),
+}
+
+# Documents per cursor round trip and per decoded Arrow batch
+BATCH_SIZE = 50_000
+
 
+def select_schema(dataset, columns=None):
+    """Return the Arrow schema of a dataset restricted to `columns` (all columns if None)."""
+    schema = ELHUB_SCHEMAS[dataset]
+    if columns is None:
+        return schema
+    unknown = set(columns) - set(schema.names)
+    if unknown:
+        raise ValueError(f"Unknown {dataset} columns: {sorted(unknown)}")
+    return pa.schema([schema.field(name) for name in columns])
 
-def area_name(price_code):
-    """Return city name for a given PriceAreaCode."""
-    for city, info in DATA.items():
-        if info['PriceAreaCode'] == price_code:
-            return city
 
+def load_columns(collection, query, schema, batch_size=BATCH_SIZE):
+    """Read the schema columns of a query into an Arrow table, decoding one typed batch at a time."""
+    projection = {"_id": 0, **{name: 1 for name in schema.names}}
+    if _find_arrow_all is not None:
+        return _find_arrow_all(collection, query, schema=_ArrowSchema(dict(zip(schema.names, schema.types))),
+                               projection=projection, batch_size=batch_size)
 
+    cursor = collection.find(query, projection, batch_size=batch_size)
+    batches = []
+    while True:
+        docs = list(itertools.islice(cursor, batch_size))
+        if not docs:
+            break
+        arrays = [pa.array([doc.get(field.name) for doc in docs], type=field.type) for field in schema]
+        batches.append(pa.RecordBatch.from_arrays(arrays, schema=schema))
+    return pa.Table.from_batches(batches, schema=schema)
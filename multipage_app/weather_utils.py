@@ -0,0 +1,308 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+import threading
+import openmeteo_requests
+from retry_requests import retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+
+### METEOROLOGY DATA FROM OPEN METEO API ###
+
+# City metadata
+DATA = {
+    'Oslo': {'PriceAreaCode': 'NO1', 'Longitude': 10.7461, 'Latitude': 59.9127},
+    'Kristiansand': {'PriceAreaCode': 'NO2', 'Longitude': 7.9956, 'Latitude': 58.1467},
+    'Trondheim': {'PriceAreaCode': 'NO3', 'Longitude': 10.3951, 'Latitude': 63.4305},
+    'Tromsø': {'PriceAreaCode': 'NO4', 'Longitude': 18.9551, 'Latitude': 69.6489},
+    'Bergen': {'PriceAreaCode': 'NO5', 'Longitude': 5.32415, 'Latitude': 60.39299},
+}
+
+# Setup Open-Meteo client once. Responses are not cached as HTTP, the hourly values
+# are kept by the weather store below.
+_retry_session = retry(retries=5, backoff_factor=0.2)
+_openmeteo = openmeteo_requests.Client(session=_retry_session)
+
+WEATHER_URL = "https://archive-api.open-meteo.com/v1/archive"
+WEATHER_VARIABLES = ["temperature_2m", "precipitation", "wind_speed_10m",
+                     "wind_gusts_10m", "wind_direction_10m"]
+
+# Years per archive request: few requests per range, yet small enough to stream partial results
+YEARS_PER_REQUEST = 5
+
+# Concurrent archive requests
+WEATHER_WORKERS = 4
+
+
+def _hourly_frame(response):
+    """Convert one Open-Meteo response into an hourly DataFrame with a naive UTC 'date' column."""
+    hourly = response.Hourly()
+    hourly_data = {
+        "date": pd.date_range(
+            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
+            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
+            freq=pd.Timedelta(seconds=hourly.Interval()),
+            inclusive="left"
+        ),
+    }
+    for i, variable in enumerate(WEATHER_VARIABLES):
+        hourly_data[variable] = hourly.Variables(i).ValuesAsNumpy()
+
+    df = pd.DataFrame(hourly_data)
+    df['date'] = df['date'].dt.tz_localize(None)  # drop UTC
+    return df
+
+
+def fetch_weather(locations, start_date, end_date):
+    """Fetch [start_date, end_date] (inclusive dates) for several (lat, lon) locations in one request.
+
+    Returns one hourly DataFrame per location, in the order of `locations`.
+    """
+    params = {
+        "latitude": [lat for lat, _ in locations],
+        "longitude": [lon for _, lon in locations],
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "hourly": WEATHER_VARIABLES,
+        "models": "era5",
+    }
+    responses = _openmeteo.weather_api(WEATHER_URL, params=params)
+    return [_hourly_frame(response) for response in responses]
+
+
+def date_chunks(start_date, end_date, years=YEARS_PER_REQUEST):
+    """Split the inclusive date range [start_date, end_date] into spans of at most `years` years."""
+    chunks = []
+    lo = start_date
+    while lo <= end_date:
+        try:
+            next_lo = lo.replace(year=lo.year + years)
+        except ValueError:  # 29 February
+            next_lo = lo.replace(year=lo.year + years, day=28)
+        hi = min(next_lo - timedelta(days=1), end_date)
+        chunks.append((lo, hi))
+        lo = next_lo
+    return chunks
+
+
+def iter_weather(jobs):
+    """Run (locations, start_date, end_date) archive requests concurrently.
+
+    Yields (locations, start_date, end_date, frames) as each request completes, with one
+    DataFrame per location, so pages can render partial results while the rest loads.
+    """
+    with ThreadPoolExecutor(max_workers=WEATHER_WORKERS) as pool:
+        futures = {pool.submit(fetch_weather, *job): job for job in jobs}
+        for future in as_completed(futures):
+            yield (*futures[future], future.result())
+
+
+### WEATHER STORE ###
+
+# Hourly values of every grid cell are kept as one memory-mapped float32 (hour, variable)
+# .npy array spanning WEATHER_START..WEATHER_END, with a per-day flag of which days have
+# been fetched. Together the cells form a (cell, hour, variable) cube: reads touch only
+# the pages of the hours sliced, and a new cell is one more file rather than a rewrite.
+WEATHER_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".weather_store")
+WEATHER_START = date(2000, 1, 1)
+WEATHER_END = date(2025, 12, 31)
+WEATHER_DAYS = (WEATHER_END - WEATHER_START).days + 1
+
+# Years prebuilt for the DATA cities by scripts/build_weather_cube.py
+WEATHER_CUBE_YEARS = (2000, 2024)
+
+
+# Spacing of the ERA5 grid in degrees. Coordinates are snapped to the nearest grid point
+# before fetching and caching, so all clicks inside one cell share one cached series.
+ERA5_GRID_DEG = 0.25
+
+
+def weather_cell(lat, lon):
+    """Return the ERA5 grid point (lat, lon) nearest to a coordinate, the store key of its weather."""
+    return (round(round(lat / ERA5_GRID_DEG) * ERA5_GRID_DEG, 4),
+            round(round(lon / ERA5_GRID_DEG) * ERA5_GRID_DEG, 4))
+
+
+def _day_runs(missing, first_day):
+    """Return inclusive (start_date, end_date) runs of consecutive True days."""
+    runs = []
+    days = np.flatnonzero(missing)
+    if len(days) == 0:
+        return runs
+    breaks = np.flatnonzero(np.diff(days) > 1)
+    for lo, hi in zip(np.r_[days[0], days[breaks + 1]], np.r_[days[breaks], days[-1]]):
+        runs.append((first_day + timedelta(days=int(lo)), first_day + timedelta(days=int(hi))))
+    return runs
+
+
+class WeatherStore:
+    """Hourly weather per grid cell that fetches only the days it does not hold yet.
+
+    Calendar years, July-June snow years and arbitrary windows are all served by slicing
+    the same arrays, so an hour is downloaded once no matter which view asked for it.
+    """
+
+    def __init__(self, path=WEATHER_STORE_DIR):
+        self.path = path
+        self.cells = {}  # cell -> (values float32 (hours, variables), fetched bool (days,))
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _files(self, cell):
+        stem = os.path.join(self.path, f"{cell[0]:.4f}_{cell[1]:.4f}")
+        return stem + ".values.npy", stem + ".days.npy"
+
+    def _arrays(self, cell):
+        with self.lock:
+            if cell not in self.cells:
+                values_file, days_file = self._files(cell)
+                if os.path.exists(days_file):
+                    self.cells[cell] = (np.load(values_file, mmap_mode="r+"), np.load(days_file))
+                else:
+                    values = np.lib.format.open_memmap(values_file, mode="w+", dtype=np.float32,
+                                                       shape=(WEATHER_DAYS * 24, len(WEATHER_VARIABLES)))
+                    values[:] = np.nan
+                    self.cells[cell] = (values, np.zeros(WEATHER_DAYS, dtype=bool))
+            return self.cells[cell]
+
+    def _save(self, cell):
+        # Values are written in place, the day flags only once the values are on disk
+        values, fetched = self.cells[cell]
+        values.flush()
+        np.save(self._files(cell)[1], fetched)
+
+    @staticmethod
+    def _day_slice(start_date, end_date):
+        if start_date < WEATHER_START or end_date > WEATHER_END:
+            raise ValueError(f"Weather store covers {WEATHER_START} to {WEATHER_END}, got {start_date} to {end_date}")
+        return slice((start_date - WEATHER_START).days, (end_date - WEATHER_START).days + 1)
+
+    def iter_fill(self, cells, start_date, end_date):
+        """Fetch the missing days of [start_date, end_date] for several cells.
+
+        Cells missing the same days share multi-location requests. Yields
+        (start_date, end_date) of each request as it completes.
+        """
+        days = self._day_slice(start_date, end_date)
+        by_runs = {}
+        for cell in dict.fromkeys(cells):
+            runs = tuple(_day_runs(~self._arrays(cell)[1][days], start_date))
+            if runs:
+                by_runs.setdefault(runs, []).append(cell)
+
+        jobs = [(group, lo, hi) for runs, group in by_runs.items()
+                for run in runs for lo, hi in date_chunks(*run)]
+        for group, lo, hi, frames in iter_weather(jobs):
+            hours = slice((lo - WEATHER_START).days * 24, ((hi - WEATHER_START).days + 1) * 24)
+            with self.lock:
+                for cell, frame in zip(group, frames):
+                    values, fetched = self.cells[cell]
+                    values[hours] = frame[WEATHER_VARIABLES].to_numpy(dtype=np.float32)
+                    fetched[self._day_slice(lo, hi)] = True
+                    self._save(cell)
+            yield lo, hi
+
+    def fill(self, cells, start_date, end_date):
+        """Fetch the missing days of [start_date, end_date] for several cells."""
+        for _ in self.iter_fill(cells, start_date, end_date):
+            pass
+
+    def window(self, cell, start_date, end_date):
+        """Read-only (hour, variable) view of a cell for [start_date, end_date], sliced without a copy."""
+        self.fill([cell], start_date, end_date)
+        days = self._day_slice(start_date, end_date)
+        view = np.asarray(self._arrays(cell)[0][days.start * 24:days.stop * 24])
+        view.flags.writeable = False
+        return view
+
+    def cube(self, cells, start_date, end_date):
+        """(cell, hour, variable) array of several cells for [start_date, end_date]."""
+        self.fill(cells, start_date, end_date)
+        return np.stack([self.window(cell, start_date, end_date) for cell in cells])
+
+    def frame(self, cell, start_date, end_date):
+        """Return the hourly DataFrame ('date' + WEATHER_VARIABLES) of a cell for [start_date, end_date].
+
+        The grid cell the values belong to is returned in df.attrs["grid_cell"].
+        """
+        df = pd.DataFrame(self.window(cell, start_date, end_date), columns=WEATHER_VARIABLES)
+        df.insert(0, "date", weather_hours(start_date, end_date))
+        df.attrs["grid_cell"] = cell
+        return df
+
+
+@st.cache_resource
+def weather_store():
+    """Return the WeatherStore shared by all sessions of this server process."""
+    return WeatherStore()
+
+
+def weather_hours(start_date, end_date):
+    """Time index of the store's hourly rows for the inclusive range [start_date, end_date]."""
+    return pd.date_range(start_date, end_date + timedelta(days=1), freq="h", inclusive="left")
+
+
+def get_weather(coords, start_date, end_date):
+    """Return hourly weather of the grid cell of (lat, lon) for the inclusive range [start_date, end_date].
+
+    The resolved grid cell is in df.attrs["grid_cell"].
+    """
+    return weather_store().frame(weather_cell(*coords), start_date, end_date)
+
+
+def month_rows(times, first_month, last_month):
+    """Row slice of the months first_month..last_month (1-12) in one year of sorted hourly times.
+
+    Found by binary search on the timestamps, so selecting months needs no per-row month column.
+    """
+    times = np.asarray(times)
+    year = times[0].astype("datetime64[Y]")
+    bounds = np.array([year + np.timedelta64(first_month - 1, "M"),
+                       year + np.timedelta64(last_month, "M")]).astype(times.dtype)
+    return slice(*(int(i) for i in times.searchsorted(bounds)))
+
+
+# Variables whose daily value is the day's total rather than its mean
+DAILY_TOTALS = ["precipitation"]
+
+
+@st.cache_data
+def daily_by_year(cell, first_year, last_year, variable):
+    """Daily values of one variable of a cell as a (years, 365) array, 29 February dropped.
+
+    Rows line up by day of year, for year-over-year comparisons and climatology baselines.
+    """
+    hourly = weather_store().window(cell, date(first_year, 1, 1), date(last_year, 12, 31))
+    daily = hourly[:, WEATHER_VARIABLES.index(variable)].reshape(-1, 24)
+    daily = daily.sum(axis=1) if variable in DAILY_TOTALS else daily.mean(axis=1)
+    days = pd.date_range(date(first_year, 1, 1), date(last_year, 12, 31), freq="D")
+    return daily[~((days.month == 2) & (days.day == 29))].reshape(last_year - first_year + 1, 365)
+
+
+def api_call(coords, year):
+    """Fetch hourly weather data for the grid cell of given coordinates and year."""
+    lat, lon = coords
+    for info in DATA.values():
+        if (info['Latitude'], info['Longitude']) == (lat, lon):
+            # Fetch all cities together the first time one of them is asked for
+            cells = [weather_cell(i['Latitude'], i['Longitude']) for i in DATA.values()]
+            weather_store().fill(cells, date(year, 1, 1), date(year, 12, 31))
+    return get_weather(coords, date(year, 1, 1), date(year, 12, 31))
+
+
+def get_coords_by_price_code(price_code):
+    """Return (lat, lon) for a given PriceAreaCode."""
+    for _, info in DATA.items():
+        if info['PriceAreaCode'] == price_code:
+            return info['Latitude'], info['Longitude']
+
+
+def area_name(price_code):
+    """Return city name for a given PriceAreaCode."""
+    for city, info in DATA.items():
+        if info['PriceAreaCode'] == price_code:
+            return city
+
+